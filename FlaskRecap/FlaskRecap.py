@@ -1,6 +1,9 @@
 from flask import Flask, request, jsonify, abort
+from fsnd_common.fast_json import use_fast_json
 
 app = Flask(__name__)
+# jsonify through orjson or msgspec when installed
+use_fast_json(app)
 
 greetings = {
             'en': 'hello', 
@@ -0,0 +1,6 @@
+'''
+fsnd_common
+    the flask layer shared by the projects, one module per concern
+    (see README.md). import the modules themselves, so an app only
+    needs the dependencies of the ones it uses
+'''
@@ -0,0 +1,192 @@
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# bodies smaller than this are sent as they are
+MIN_SIZE = 1024
+# compressed bodies kept, keyed by the hash of the uncompressed body
+CACHE_SIZE = 256
+# larger bodies are compressed on every request, not kept
+MAX_CACHED_SIZE = 1024 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# gzip header and trailer around the deflate stream, with a zero mtime
+# so the same body always compresses to the same bytes
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# media types worth compressing
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+'''
+supported_encodings()
+    the content encodings which can be sent, preferred first
+'''
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _read_body(written, app_iter):
+    try:
+        return b''.join(written) + b''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+
+'''
+negotiate(accept_encoding, encodings)
+    the encoding of `encodings` with the highest q-value in the
+    Accept-Encoding header, the first one on a tie, or None when the
+    client accepts none of them
+'''
+
+
+@lru_cache(maxsize=64)
+def negotiate(accept_encoding, encodings):
+    qualities = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+'''
+CompressionMiddleware
+    WSGI middleware sending json and text responses gzip or brotli
+    encoded, as negotiated with Accept-Encoding, when their
+    Content-Length is at least `min_size`. streamed responses (without
+    a Content-Length), other statuses than 200 and HEAD requests are
+    passed through untouched.
+    compressed bodies are kept in an LRU of `cache_size` entries keyed
+    by the encoding and the hash of the body, so a listing served again
+    unchanged is hashed, not compressed again. the ETag of a compressed
+    response is made weak, which If-None-Match still matches
+'''
+
+
+class CompressionMiddleware:
+
+    def __init__(self, wsgi_app, min_size=MIN_SIZE, cache_size=CACHE_SIZE,
+                 gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.cache_size = cache_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = supported_encodings()
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _encode(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, GZIP_WBITS)
+        return compressor.compress(body) + compressor.flush()
+
+    '''
+    compress(body, encoding)
+        the `body` encoded with `encoding`, from the cache when it was
+        compressed before
+    '''
+    def compress(self, body, encoding):
+        key = (encoding, hashlib.sha1(body).digest())
+        with self._lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+
+        compressed = self._encode(body, encoding)
+        if self.cache_size > 0 and len(body) <= MAX_CACHED_SIZE:
+            with self._lock:
+                self._cache[key] = compressed
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return compressed
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _should_compress(self, status, headers):
+        if not status.startswith('200') or 'content-encoding' in headers:
+            return False
+        if 'no-transform' in headers.get('cache-control', ''):
+            return False
+        try:
+            return int(headers.get('content-length', 0)) >= self.min_size
+        except ValueError:
+            return False
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        response = []
+        written = []
+
+        def capture_start_response(status, response_headers, exc_info=None):
+            response[:] = [status, response_headers, exc_info]
+            return written.append
+
+        app_iter = self.wsgi_app(environ, capture_start_response)
+        status, response_headers, exc_info = response
+        headers = dict((name.lower(), value) for name, value in response_headers)
+        if not headers.get('content-type', '').startswith(COMPRESSIBLE_TYPES):
+            start_response(status, response_headers, exc_info)
+            return app_iter if len(written) == 0 else [_read_body(written, app_iter)]
+
+        # the body depends on Accept-Encoding, whether compressed or not
+        vary = headers.get('vary')
+        response_headers = [(name, value) for name, value in response_headers if name.lower() != 'vary']
+        response_headers.append(('Vary', 'Accept-Encoding' if not vary else vary + ', Accept-Encoding'))
+
+        if encoding is None or not self._should_compress(status, headers):
+            start_response(status, response_headers, exc_info)
+            return app_iter if len(written) == 0 else [_read_body(written, app_iter)]
+
+        body = _read_body(written, app_iter)
+        compressed = self.compress(body, encoding)
+        if len(compressed) >= len(body):
+            start_response(status, response_headers, exc_info)
+            return [body]
+
+        encoded_headers = []
+        for name, value in response_headers:
+            name_lower = name.lower()
+            if name_lower == 'content-length':
+                continue
+            if name_lower == 'etag' and not value.startswith('W/'):
+                value = 'W/' + value
+            encoded_headers.append((name, value))
+        encoded_headers.append(('Content-Encoding', encoding))
+        encoded_headers.append(('Content-Length', str(len(compressed))))
+        start_response(status, encoded_headers, exc_info)
+        return [compressed]
@@ -0,0 +1,46 @@
+ALLOW_ORIGIN = '*'
+ALLOW_HEADERS = 'Content-Type, Authorization'
+ALLOW_METHODS = 'GET, POST, PUT, PATCH, DELETE, OPTIONS'
+# seconds a browser may cache a preflight answer
+MAX_AGE = 86400
+
+'''
+CorsMiddleware
+    WSGI middleware adding the CORS headers to the responses of the
+    paths starting with one of `prefixes`, other paths are passed
+    through untouched.
+    the header tuples are built once. preflight requests (OPTIONS with
+    an Access-Control-Request-Method header) are answered right away
+    with a 204 and Access-Control-Max-Age, without reaching flask
+'''
+
+
+class CorsMiddleware:
+
+    def __init__(self, wsgi_app, prefixes=('/api/',), origin=ALLOW_ORIGIN,
+                 allow_headers=ALLOW_HEADERS, allow_methods=ALLOW_METHODS, max_age=MAX_AGE):
+        self.wsgi_app = wsgi_app
+        self.prefixes = tuple(prefixes)
+        self.headers = [
+            ('Access-Control-Allow-Origin', origin),
+            ('Access-Control-Allow-Headers', allow_headers),
+            ('Access-Control-Allow-Methods', allow_methods)
+        ]
+        self.preflight_headers = self.headers + [
+            ('Access-Control-Max-Age', str(max_age)),
+            ('Content-Length', '0')
+        ]
+
+    def __call__(self, environ, start_response):
+        if not environ.get('PATH_INFO', '').startswith(self.prefixes):
+            return self.wsgi_app(environ, start_response)
+
+        if environ['REQUEST_METHOD'] == 'OPTIONS' and 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' in environ:
+            start_response('204 No Content', self.preflight_headers)
+            return [b'']
+
+        headers = self.headers
+
+        def start_response_with_cors(status, response_headers, exc_info=None):
+            return start_response(status, response_headers + headers, exc_info)
+        return self.wsgi_app(environ, start_response_with_cors)
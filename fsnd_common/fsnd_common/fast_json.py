@@ -0,0 +1,183 @@
+import dataclasses
+import datetime
+import decimal
+import json
+import os
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    # flask >= 2.2
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None
+
+# json encoders, fastest first
+BACKENDS = ('orjson', 'msgspec', 'json')
+# every backend writes compact json
+SEPARATORS = (',', ':')
+
+
+'''
+available_backends()
+    the json encoders which are installed, fastest first
+'''
+
+
+def available_backends():
+    installed = {'orjson': orjson is not None, 'msgspec': msgspec is not None, 'json': True}
+    return [backend for backend in BACKENDS if installed[backend]]
+
+
+'''
+default(value)
+    the values json does not know, written the same way by every backend:
+    datetime, date and time as ISO 8601 strings, decimals and uuids as strings
+'''
+
+
+def default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def _json_dumps(obj, sort_keys=True):
+    return json.dumps(obj, default=default, sort_keys=sort_keys, separators=SEPARATORS)
+
+
+def _orjson_dumps(obj, sort_keys=True):
+    option = orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+
+
+if msgspec is not None:
+    try:
+        _msgspec_sorted = msgspec.json.Encoder(enc_hook=default, order='sorted')
+    except TypeError:
+        # msgspec < 0.17 can not sort keys
+        _msgspec_sorted = msgspec.json.Encoder(enc_hook=default)
+    _msgspec_unsorted = msgspec.json.Encoder(enc_hook=default)
+
+
+def _msgspec_dumps(obj, sort_keys=True):
+    encoder = _msgspec_sorted if sort_keys else _msgspec_unsorted
+    return encoder.encode(obj).decode('utf-8')
+
+
+def _msgspec_loads(s):
+    try:
+        return msgspec.json.decode(s)
+    except msgspec.DecodeError as error:
+        # flask answers a 400 on a ValueError
+        raise ValueError(str(error))
+
+
+_DUMPS = {'orjson': _orjson_dumps, 'msgspec': _msgspec_dumps, 'json': _json_dumps}
+_LOADS = {'orjson': orjson.loads if orjson else None, 'msgspec': _msgspec_loads, 'json': json.loads}
+
+
+'''
+dumps(obj, backend, sort_keys)
+    `obj` as a json string, written by `backend`. values the fast
+    encoders refuse (e.g. integers over 64 bits) go through json
+'''
+
+
+def dumps(obj, backend='json', sort_keys=True):
+    try:
+        return _DUMPS[backend](obj, sort_keys)
+    except TypeError:
+        if backend == 'json':
+            raise
+        return _json_dumps(obj, sort_keys)
+
+
+def loads(s, backend='json'):
+    return _LOADS[backend](s)
+
+
+if DefaultJSONProvider is not None:
+    '''
+    FastJSONProvider
+        flask json provider writing and reading json with `backend`.
+        calls with other arguments than compact separators (e.g. indent
+        in debug mode) are passed to the standard json module
+    '''
+
+    class FastJSONProvider(DefaultJSONProvider):
+        backend = 'json'
+
+        def dumps(self, obj, **kwargs):
+            sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+            if tuple(kwargs.get('separators', SEPARATORS)) == SEPARATORS:
+                kwargs.pop('separators', None)
+            if len(kwargs) > 0:
+                kwargs.setdefault('default', default)
+                return json.dumps(obj, sort_keys=sort_keys, **kwargs)
+            return dumps(obj, self.backend, sort_keys)
+
+        def loads(self, s, **kwargs):
+            if len(kwargs) > 0:
+                return json.loads(s, **kwargs)
+            return loads(s, self.backend)
+else:
+    FastJSONProvider = None
+
+
+'''
+use_fast_json(app, backend)
+    makes jsonify and request.get_json use `backend`, or the
+    JSON_BACKEND config or environment variable, or the fastest
+    encoder installed. must run before Instrumentation, which times
+    the json provider the app has when it is set up.
+    returns the backend in use
+'''
+
+
+def use_fast_json(app, backend=None):
+    backend = backend or app.config.get('JSON_BACKEND') or os.environ.get('JSON_BACKEND')
+    if backend is None:
+        backend = available_backends()[0]
+    if backend not in available_backends():
+        raise ValueError('json backend {} is not installed, use one of {}'.format(
+            backend, ', '.join(available_backends())))
+    app.config['JSON_BACKEND'] = backend
+
+    if FastJSONProvider is not None:
+        provider = FastJSONProvider(app)
+        provider.backend = backend
+        app.json = provider
+    else:
+        # flask < 2.2, jsonify encodes with app.json_encoder
+        from flask.json import JSONEncoder
+
+        class FastJSONEncoder(JSONEncoder):
+
+            def default(self, value):
+                return default(value)
+
+            def encode(self, obj):
+                if self.indent is not None:
+                    return super().encode(obj)
+                return dumps(obj, backend, self.sort_keys)
+
+        app.json_encoder = FastJSONEncoder
+    return backend
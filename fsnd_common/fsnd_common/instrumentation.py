@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .pool import pool_metrics
+
+# upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+'''
+SQL statement hooks
+    every statement run inside a request is counted and timed on the
+    request's `g`, whatever engine or session runs it. the start time is
+    kept on the statement's execution context, which is dropped with it
+    when the statement fails
+'''
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_timing' in g:
+        timing = g.request_timing
+        timing['db_queries'] += 1
+        start = getattr(context, '_query_start_time', None)
+        if start is not None:
+            timing['db_seconds'] += time.perf_counter() - start
+
+
+if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+'''
+EndpointStats
+    latency histogram, status counts, query count and time spent
+    in the database and in json serialization of one endpoint
+'''
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.statuses = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.json_seconds = 0.0
+
+    def record(self, seconds, status, timing):
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper_bound:
+                self.buckets[index] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.db_queries += timing['db_queries']
+        self.db_seconds += timing['db_seconds']
+        self.json_seconds += timing['json_seconds']
+
+
+def _labels(**labels):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels.items())
+
+
+'''
+Instrumentation
+    records the latency, SQL statements and json serialization time of
+    every request by endpoint, and serves them with the connection pool
+    metrics at METRICS_ENDPOINT (default /metrics) in the Prometheus
+    text format. with SERVER_TIMING on (or SERVER_TIMING=1 in the
+    environment), every response also gets a Server-Timing header
+    with the timings of its request
+'''
+
+
+class Instrumentation:
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._stats = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENDPOINT', '/metrics')
+        app.config.setdefault('SERVER_TIMING', os.environ.get('SERVER_TIMING') == '1')
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        self._time_json(app)
+
+        if app.config['METRICS_ENDPOINT']:
+            app.add_url_rule(app.config['METRICS_ENDPOINT'], 'metrics', self.metrics_view)
+
+    def _time_json(self, app):
+        def timed_dumps(dumps):
+            def dumps_and_time(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return dumps(*args, **kwargs)
+                finally:
+                    if has_request_context() and 'request_timing' in g:
+                        g.request_timing['json_seconds'] += time.perf_counter() - start
+            return dumps_and_time
+
+        provider = getattr(app, 'json', None)
+        if provider is not None and hasattr(provider, 'dumps'):
+            # flask >= 2.2, jsonify goes through app.json
+            provider.dumps = timed_dumps(provider.dumps)
+        else:
+            encoder = app.json_encoder
+            app.json_encoder = type(encoder.__name__, (encoder,), {'encode': timed_dumps(encoder.encode)})
+
+    def _start_request(self):
+        g.request_timing = {
+            'start': time.perf_counter(),
+            'db_queries': 0,
+            'db_seconds': 0.0,
+            'json_seconds': 0.0
+        }
+
+    def _finish_request(self, response):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return response
+
+        seconds = time.perf_counter() - timing['start']
+        key = (request.endpoint or 'none', request.method)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = EndpointStats()
+            self._stats[key].record(seconds, response.status_code, timing)
+
+        if current_app.config['SERVER_TIMING']:
+            response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries", json;dur={:.2f}, total;dur={:.2f}'.format(
+                timing['db_seconds'] * 1000, timing['db_queries'], timing['json_seconds'] * 1000, seconds * 1000))
+        return response
+
+    '''
+    metrics()
+        every metric in the Prometheus text exposition format
+    '''
+    def metrics(self):
+        lines = []
+        def family(name, kind, description):
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        with self._lock:
+            stats = sorted(self._stats.items())
+
+            family('http_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+            for (endpoint, method), one in stats:
+                for upper_bound, count in zip(LATENCY_BUCKETS, one.buckets):
+                    lines.append('http_request_duration_seconds_bucket{%s} %d' % (
+                        _labels(endpoint=endpoint, method=method, le=upper_bound), count))
+                lines.append('http_request_duration_seconds_bucket{%s} %d' % (
+                    _labels(endpoint=endpoint, method=method, le='+Inf'), one.count))
+                lines.append('http_request_duration_seconds_sum{%s} %f' % (_labels(endpoint=endpoint, method=method), one.seconds))
+                lines.append('http_request_duration_seconds_count{%s} %d' % (_labels(endpoint=endpoint, method=method), one.count))
+
+            family('http_requests_total', 'counter', 'Requests by endpoint and status.')
+            for (endpoint, method), one in stats:
+                for status, count in sorted(one.statuses.items()):
+                    lines.append('http_requests_total{%s} %d' % (_labels(endpoint=endpoint, method=method, status=status), count))
+
+            family('db_queries_total', 'counter', 'SQL statements run by endpoint.')
+            for (endpoint, method), one in stats:
+                lines.append('db_queries_total{%s} %d' % (_labels(endpoint=endpoint, method=method), one.db_queries))
+
+            family('db_query_seconds_total', 'counter', 'Time spent running SQL statements by endpoint.')
+            for (endpoint, method), one in stats:
+                lines.append('db_query_seconds_total{%s} %f' % (_labels(endpoint=endpoint, method=method), one.db_seconds))
+
+            family('json_serialization_seconds_total', 'counter', 'Time spent serializing json by endpoint.')
+            for (endpoint, method), one in stats:
+                lines.append('json_serialization_seconds_total{%s} %f' % (_labels(endpoint=endpoint, method=method), one.json_seconds))
+
+        pools = pool_metrics()
+        for name, kind, key, description in [
+                ('db_pool_size', 'gauge', 'size', 'Connections kept in the pool.'),
+                ('db_pool_in_use', 'gauge', 'in_use', 'Connections checked out of the pool.'),
+                ('db_pool_overflow', 'gauge', 'overflow', 'Connections opened beyond the pool size.'),
+                ('db_pool_checkouts_total', 'counter', 'checkouts', 'Connections checked out of the pool.'),
+                ('db_pool_checkout_wait_seconds_total', 'counter', 'wait_seconds', 'Time spent waiting for a connection.'),
+                ('db_pool_overflow_events_total', 'counter', 'overflow_events', 'Checkouts made while the pool was exhausted.'),
+                ('db_pool_timeouts_total', 'counter', 'timeouts', 'Checkouts which timed out.')]:
+            family(name, kind, description)
+            for pool in pools:
+                lines.append('{}{{{}}} {}'.format(name, _labels(pool=pool['name']), pool[key]))
+
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.metrics(), mimetype='text/plain; version=0.0.4')
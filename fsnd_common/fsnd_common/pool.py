@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import weakref
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+# setting name, type and default of every pool setting.
+# each one can be set in the app config or as an environment variable
+POOL_SETTINGS = [
+    ('DB_POOL_SIZE', int, 5),
+    ('DB_MAX_OVERFLOW', int, 10),
+    ('DB_POOL_TIMEOUT', float, 30),
+    ('DB_POOL_RECYCLE', int, 1800),
+    ('DB_POOL_PRE_PING', bool, True),
+]
+
+# run on every new SQLite connection: in WAL mode readers do not block
+# the writer, and a locked database is retried for up to 5 seconds
+# instead of failing with "database is locked"
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+]
+
+
+def _setting(config, name, kind, default):
+    value = config.get(name, os.environ.get(name))
+    if value is None:
+        return default
+    if kind is bool and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return kind(value)
+
+
+'''
+PoolMetrics
+    counters of one connection pool: checkouts, time spent waiting
+    for a connection, checkouts beyond the pool size (overflow) and
+    checkouts which timed out. snapshot() adds the connections in use
+'''
+
+
+class PoolMetrics:
+
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.overflow_events = 0
+            self.timeouts = 0
+
+    def record(self, wait_seconds, overflow=False, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if overflow:
+                self.overflow_events += 1
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def snapshot(self):
+        pool = self.pool() if self.pool is not None else None
+        with self._lock:
+            return {
+                'name': self.name,
+                'size': pool.size() if pool is not None else 0,
+                'in_use': pool.checkedout() if pool is not None else 0,
+                'overflow': max(pool.overflow(), 0) if pool is not None else 0,
+                'checkouts': self.checkouts,
+                'wait_seconds': self.wait_seconds,
+                'max_wait_seconds': self.max_wait_seconds,
+                'overflow_events': self.overflow_events,
+                'timeouts': self.timeouts
+            }
+
+
+'''
+MeteredQueuePool
+    a QueuePool which records how long each checkout waited
+'''
+
+
+class MeteredQueuePool(QueuePool):
+
+    metrics = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics.pool = weakref.ref(self)
+
+    def _do_get(self):
+        overflow = self.checkedout() >= self.size()
+        start = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            self.metrics.record(time.monotonic() - start, timed_out=True)
+            raise
+        self.metrics.record(time.monotonic() - start, overflow=overflow)
+        return connection
+
+
+# metrics of every metered pool, by name
+_metrics = {}
+_pool_classes = {}
+
+
+def metered_pool_class(name):
+    if name not in _pool_classes:
+        _metrics[name] = PoolMetrics(name)
+        _pool_classes[name] = type('MeteredQueuePool', (MeteredQueuePool,),
+                                   {'metrics': _metrics[name]})
+    return _pool_classes[name]
+
+
+'''
+pool_metrics()
+    snapshots of every metered pool
+'''
+
+
+def pool_metrics():
+    return [metrics.snapshot() for metrics in _metrics.values()]
+
+
+'''
+engine_options(database_uri, config, name)
+    SQLALCHEMY_ENGINE_OPTIONS for the database: pool size, overflow,
+    checkout timeout, recycle and pre-ping, read from `config` or the
+    environment. the pool is metered under `name`.
+    an in memory SQLite database keeps its single shared connection
+'''
+
+
+def engine_options(database_uri, config=None, name='default'):
+    config = config or {}
+    settings = dict((setting, _setting(config, setting, kind, default))
+                    for setting, kind, default in POOL_SETTINGS)
+
+    options = {
+        'pool_pre_ping': settings['DB_POOL_PRE_PING'],
+        'pool_recycle': settings['DB_POOL_RECYCLE']
+    }
+
+    url = make_url(database_uri)
+    if url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:'):
+        return options
+
+    options.update({
+        'poolclass': metered_pool_class(name),
+        'pool_size': settings['DB_POOL_SIZE'],
+        'max_overflow': settings['DB_MAX_OVERFLOW'],
+        'pool_timeout': settings['DB_POOL_TIMEOUT']
+    })
+    if url.drivername.startswith('sqlite'):
+        # pooled SQLite connections are handed to other threads
+        options['connect_args'] = {'check_same_thread': False}
+    return options
+
+
+'''
+use_sqlite_wal()
+    runs SQLITE_PRAGMAS on every new SQLite connection
+'''
+
+
+def use_sqlite_wal():
+    if not event.contains(Engine, 'connect', _sqlite_pragmas):
+        event.listen(Engine, 'connect', _sqlite_pragmas)
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__ == 'sqlite3':
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
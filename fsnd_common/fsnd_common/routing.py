@@ -0,0 +1,214 @@
+import hashlib
+import itertools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+from .pool import engine_options
+
+# seconds a client reads from the primary after it wrote
+REPLICA_PIN_SECONDS = 5
+# cookie holding the time until which a client reads from the primary
+PIN_COOKIE = 'db_primary_until'
+# requests which may read from a replica, with the views marked by
+# replica_reads()
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# raw sql statements which write
+WRITE_STATEMENT = re.compile(r'\s*(insert|update|delete|replace|merge|create|alter|drop|truncate)\b', re.IGNORECASE)
+# clients pinned in memory, for the ones which do not keep cookies
+MAX_PINNED_CLIENTS = 10000
+
+
+def _is_write(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    return isinstance(clause, TextClause) and WRITE_STATEMENT.match(clause.text) is not None
+
+
+def _wrote():
+    g.db_wrote = True
+    g.db_replica = None
+
+
+'''
+RoutingSession
+    a session reading from the replica chosen for the request, if any.
+    flushes, INSERT, UPDATE and DELETE statements, and reads while
+    changes are pending go to the primary. a request which wrote reads
+    from the primary from then on, and its client is pinned to it.
+    connection() without a statement is a read, writes through it must
+    run inside use_primary()
+'''
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context():
+            if self._flushing or _is_write(clause):
+                _wrote()
+            elif g.get('db_replica') is not None and self._is_clean():
+                return g.db_replica
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    if has_request_context():
+        _wrote()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+'''
+use_primary()
+    reads inside the block go to the primary, e.g. to fill a cache
+    which must not keep what a lagging replica returned
+'''
+
+
+@contextmanager
+def use_primary():
+    if not has_request_context():
+        yield
+        return
+
+    replica = g.pop('db_replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None and not g.get('db_wrote'):
+            g.db_replica = replica
+
+
+'''
+replica_reads(view)
+    marks a view which only reads, e.g. a search sent as a POST, so its
+    requests read from a replica like GET requests
+'''
+
+
+def replica_reads(view):
+    view.replica_reads = True
+    return view
+
+
+'''
+ReplicaRouter
+    sends the GET, HEAD and OPTIONS requests, and the ones of the views
+    marked by replica_reads(), to the replicas listed in
+    DATABASE_REPLICA_URLS (config or environment, comma separated),
+    in turn. other requests, and every request without replicas, use
+    the primary SQLALCHEMY_DATABASE_URI.
+    a client whose request wrote to the database reads from the primary
+    for DB_REPLICA_PIN_SECONDS, so it reads its own writes. the client
+    is pinned with a cookie, and in memory by its Authorization
+    header for clients which do not keep cookies. anonymous clients
+    are only pinned by the cookie: many of them can share an address,
+    behind a proxy or a NAT, and would all be sent to the primary
+'''
+
+
+class ReplicaRouter:
+
+    def __init__(self, app=None, name='default'):
+        self.name = name
+        self.replicas = []
+        self.pin_seconds = REPLICA_PIN_SECONDS
+        self._next_replica = None
+        self._pinned = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        urls = app.config.get('DATABASE_REPLICA_URLS', os.environ.get('DATABASE_REPLICA_URLS'))
+        if isinstance(urls, str):
+            urls = [url.strip() for url in urls.split(',') if len(url.strip()) > 0]
+        self.pin_seconds = float(app.config.get('DB_REPLICA_PIN_SECONDS',
+                                                os.environ.get('DB_REPLICA_PIN_SECONDS', REPLICA_PIN_SECONDS)))
+        self.configure(urls or [], app.config)
+
+        app.extensions['replica_router'] = self
+        app.before_request(self._route_request)
+        app.after_request(self._pin_after_write)
+
+    '''
+    configure(urls, config)
+        replaces the replicas by engines of `urls`, each with its own
+        metered pool
+    '''
+    def configure(self, urls, config=None):
+        replicas = [create_engine(url, **engine_options(url, config, '{}_replica_{}'.format(self.name, index)))
+                    for index, url in enumerate(urls)]
+        with self._lock:
+            old_replicas = self.replicas
+            self.replicas = replicas
+            self._next_replica = itertools.cycle(replicas) if len(replicas) > 0 else None
+            self._pinned.clear()
+        for engine in old_replicas:
+            engine.dispose()
+
+    def _client_key(self):
+        client = request.headers.get('Authorization')
+        if client is None:
+            return None
+        return hashlib.sha256(client.encode('utf-8')).digest()
+
+    def is_pinned(self):
+        now = time.time()
+        try:
+            if float(request.cookies.get(PIN_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        key = self._client_key()
+        return key is not None and self._pinned.get(key, 0) > now
+
+    def _reads_only(self):
+        if request.method in READ_METHODS:
+            return True
+        view = current_app.view_functions.get(request.endpoint)
+        return getattr(view, 'replica_reads', False)
+
+    def _route_request(self):
+        g.db_replica = None
+        g.db_wrote = False
+        if self._next_replica is None or not self._reads_only() or self.is_pinned():
+            return
+
+        with self._lock:
+            if self._next_replica is not None:
+                g.db_replica = next(self._next_replica)
+
+    def _pin_after_write(self, response):
+        if self._next_replica is None or not g.get('db_wrote'):
+            return response
+
+        until = time.time() + self.pin_seconds
+        response.set_cookie(PIN_COOKIE, '{:.3f}'.format(until), max_age=max(1, int(self.pin_seconds + 1)),
+                            httponly=True, samesite='Lax')
+        key = self._client_key()
+        if key is None:
+            return response
+        with self._lock:
+            if len(self._pinned) >= MAX_PINNED_CLIENTS:
+                now = time.time()
+                self._pinned = dict((key, pinned_until) for key, pinned_until in self._pinned.items()
+                                    if pinned_until > now)
+                # still full, forget the clients pinned first
+                while len(self._pinned) >= MAX_PINNED_CLIENTS:
+                    del self._pinned[next(iter(self._pinned))]
+            self._pinned[key] = until
+        return response
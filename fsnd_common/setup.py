@@ -0,0 +1,15 @@
+from setuptools import setup
+
+setup(
+    name='fsnd-common',
+    version='0.1.0',
+    description='Flask layer shared by the Full Stack Nanodegree projects',
+    packages=['fsnd_common'],
+    python_requires='>=3.7',
+    install_requires=['Flask'],
+    extras_require={
+        # pool, routing and instrumentation
+        'db': ['Flask-SQLAlchemy', 'SQLAlchemy'],
+        'fast': ['orjson', 'brotli'],
+    },
+)
@@ -6,7 +6,8 @@ import json
 from flask import Flask, render_template, request, Response, flash, redirect, url_for
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
@@ -14,6 +15,9 @@ from forms import *
 from flask_migrate import Migrate
 import sys
 from helper import *
+from fsnd_common.instrumentation import Instrumentation
+from fsnd_common.fast_json import use_fast_json
+from fsnd_common.routing import ReplicaRouter, RoutingSQLAlchemy
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -24,9 +28,23 @@ moment = Moment(app)
 app.config.from_object('config')
 
 # TODO: connect to a local postgresql database
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
 
+# SQLite only enforces the foreign keys, and their ON DELETE CASCADE,
+# on connections which turn them on. Postgres always does
+@event.listens_for(Engine, 'connect')
+def enableSqliteForeignKeys(dbapi_connection, connection_record):
+  if type(dbapi_connection).__module__ == 'sqlite3':
+    dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+# GET requests read from DATABASE_REPLICA_URLS when set, see fsnd_common.routing
+replica_router = ReplicaRouter(app, 'fyyur')
+# jsonify through orjson or msgspec when installed, datetimes as ISO 8601
+use_fast_json(app)
+# request latency and sql metrics at /metrics
+instrumentation = Instrumentation(app)
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
@@ -0,0 +1,103 @@
+'''
+Compares the old show-by-show venue delete with the set based delete.
+
+    python benchmarks/bench_delete.py                # venues with 1000 and 5000 shows
+    python benchmarks/bench_delete.py 500 10000      # custom number of shows
+
+Uses DATABASE_URL when set, otherwise a temporary SQLite file.
+The tables of that database are dropped and created again for every run.
+'''
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+  os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'fyyur_bench.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import app, db
+from db_models_setup import Show, Artist, Venue, deleteVenueCascade
+
+DEFAULT_SHOWS = [1000, 5000]
+ARTISTS = 50
+
+#  ----------------------------------------------------------------  
+#  A venue with `shows` shows, spread over ARTISTS artists
+#  ----------------------------------------------------------------
+def seed(shows):
+  db.drop_all()
+  db.create_all()
+
+  venue = Venue(name='Bench Venue', city='San Francisco', state='CA')
+  artists = [Artist(name='Bench Artist {}'.format(index)) for index in range(ARTISTS)]
+  db.session.add(venue)
+  db.session.add_all(artists)
+  db.session.flush()
+
+  now = datetime.now()
+  for index in range(shows):
+    artist = artists[index % ARTISTS]
+    show = Show(venue_id=venue.id, artist_id=artist.id, time=now + timedelta(hours=index))
+    venue.shows.append(show)
+    artist.shows.append(show)
+  db.session.commit()
+
+  venue_id = venue.id
+  db.session.remove()
+  return venue_id
+
+#  ----------------------------------------------------------------  
+#  The venue delete as it was done before, one show at a time
+#  ----------------------------------------------------------------
+def legacy_delete_venue(venue_id):
+  venue = Venue.query.get(venue_id)
+
+  for show in venue.shows:
+    venue.shows.remove(show)
+
+  shows = Show.query.filter(Show.venue_id==venue_id)
+  showIds = [oneShow.id for oneShow in shows]
+
+  for oneShow in shows:
+    artist = Artist.query.get(oneShow.artist_id)
+    for artistShow in artist.shows:
+      if artistShow.id in showIds:
+        artist.shows.remove(artistShow)
+
+  shows.delete()
+  db.session.delete(venue)
+  db.session.commit()
+
+def set_based_delete_venue(venue_id):
+  deleteVenueCascade(venue_id)
+  db.session.commit()
+
+def measure(delete, venue_id):
+  statements = []
+  def count(*args):
+    statements.append(1)
+
+  event.listen(db.engine, 'before_cursor_execute', count)
+  started = time.perf_counter()
+  delete(venue_id)
+  elapsed = (time.perf_counter() - started) * 1000
+  event.remove(db.engine, 'before_cursor_execute', count)
+  db.session.remove()
+  return elapsed, len(statements)
+
+def main():
+  sizes = [int(size) for size in sys.argv[1:]] or DEFAULT_SHOWS
+
+  print('{:>7} {:<10} {:>10} {:>11}'.format('shows', 'delete', 'ms', 'statements'))
+  for size in sizes:
+    for name, delete in [('legacy', legacy_delete_venue), ('set based', set_based_delete_venue)]:
+      venue_id = seed(size)
+      elapsed, statements = measure(delete, venue_id)
+      print('{:>7} {:<10} {:>10.1f} {:>11}'.format(size, name, elapsed, statements))
+
+if __name__ == '__main__':
+  main()
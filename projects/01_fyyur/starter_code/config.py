@@ -1,4 +1,5 @@
 import os
+from fsnd_common.pool import engine_options
 SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -10,5 +11,19 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://XinghouLiu@localhost:5432/FyyurApp'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://XinghouLiu@localhost:5432/FyyurApp')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Pool size, overflow, checkout timeout, recycle and pre-ping, read from
+# DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE and
+# DB_POOL_PRE_PING in the environment
+SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, name='fyyur')
+
+# Read upcoming show counts of the venues listing from the venue_show_summary
+# table, which is refreshed when shows are added or deleted
+USE_VENUE_SUMMARY = os.environ.get('USE_VENUE_SUMMARY') == '1'
+
+# The foreign keys to Venue, Artist and Show delete in cascade (migration
+# 2d7b8e41c6f3 on Postgres, PRAGMA foreign_keys in app.py on SQLite), so
+# deleting a venue or artist is one statement
+USE_DB_CASCADE = os.environ.get('USE_DB_CASCADE') == '1'
@@ -1,17 +1,22 @@
 from app import app, db, migrate, moment
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, case, event, func, or_, select, inspect
+from itertools import groupby
 from datetime import *
 from helper import *
+from fsnd_common.routing import use_primary
 
 #  ----------------------------------------------------------------  
 #  Show table
 #  ----------------------------------------------------------------  
 class Show(db.Model):
   __tablename__ = 'Show'
+  # the upcoming shows feed is read in (time, id) order
+  __table_args__ = (db.Index('ix_Show_time_id', 'time', 'id'),)
 
   id = db.Column(db.Integer, primary_key=True)
-  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
-  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'))
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'))
 
   title = db.Column(db.String)
   description = db.Column(db.String)
@@ -25,8 +30,35 @@ class Show(db.Model):
 #  which is Many to Many relationship
 #  ----------------------------------------------------------------  
 show_artist = db.Table('show_artist', 
-    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
-    db.Column('show_id', db.Integer, db.ForeignKey('Show.id'), primary_key=True)
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('show_id', db.Integer, db.ForeignKey('Show.id', ondelete='CASCADE'), primary_key=True)
+)
+
+#  ----------------------------------------------------------------  
+#  Genre table
+#  ----------------------------------------------------------------  
+class Genre(db.Model):
+  __tablename__ = 'Genre'
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(120), nullable=False, unique=True, index=True)
+
+  def __repr__(self):
+    return f'<Genre {self.id} {self.name}>'
+
+#  ----------------------------------------------------------------  
+#  Reference tables between Genre and Artist / Venue,
+#  which are Many to Many relationships.
+#  genre_id is indexed to find all the artists or venues of a genre
+#  ----------------------------------------------------------------  
+artist_genre = db.Table('artist_genre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+venue_genre = db.Table('venue_genre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True, index=True)
 )
 
 #  ----------------------------------------------------------------  
@@ -40,7 +72,7 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=artist_genre, order_by='Genre.name', lazy=True)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
@@ -59,8 +91,8 @@ class Artist(db.Model):
 #  which is Many to Many relationship
 #  ----------------------------------------------------------------  
 show_venue = db.Table('show_venue',
-    db.Column('venu_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
-    db.Column('show_id', db.Integer, db.ForeignKey('Show.id'), primary_key=True)
+    db.Column('venu_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('show_id', db.Integer, db.ForeignKey('Show.id', ondelete='CASCADE'), primary_key=True)
 )
 
 #  ----------------------------------------------------------------  
@@ -75,7 +107,7 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=venue_genre, order_by='Genre.name', lazy=True)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
@@ -88,6 +120,172 @@ class Venue(db.Model):
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
+#  ----------------------------------------------------------------  
+#  Genres with the given names, created when they do not exist yet
+#  ----------------------------------------------------------------
+def genresFromNames(names):
+  names = sorted(set(name.strip() for name in names if name is not None and len(name.strip()) > 0))
+  if len(names) == 0:
+    return []
+
+  genres = Genre.query.filter(Genre.name.in_(names)).all()
+  known = set(genre.name for genre in genres)
+  for name in names:
+    if name not in known:
+      genre = Genre(name=name)
+      db.session.add(genre)
+      genres.append(genre)
+
+  return sorted(genres, key=lambda genre: genre.name)
+
+#  ----------------------------------------------------------------  
+#  Names of the genres of an artist or a venue
+#  ----------------------------------------------------------------
+def genreNames(item):
+  return [genre.name for genre in item.genres]
+
+#  ----------------------------------------------------------------  
+#  Venue show summary table
+#  Number of upcoming shows of each venue, and the time of its next
+#  show: once that time has passed the row is stale and is refreshed.
+#  Used by the venues listing when USE_VENUE_SUMMARY is enabled
+#  ----------------------------------------------------------------  
+class VenueShowSummary(db.Model):
+    __tablename__ = 'venue_show_summary'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    num_upcoming_shows = db.Column(db.Integer, nullable=False)
+    next_show_time = db.Column(db.DateTime, nullable=False, index=True)
+
+#  ----------------------------------------------------------------  
+#  Recompute the summary rows of some venues
+#  ----------------------------------------------------------------
+def refreshVenueSummary(connection, venue_ids):
+  venue_ids = [venue_id for venue_id in set(venue_ids) if venue_id is not None]
+  if len(venue_ids) == 0:
+    return
+
+  summary = VenueShowSummary.__table__
+  shows = Show.__table__
+  connection.execute(summary.delete().where(summary.c.venue_id.in_(venue_ids)))
+
+  upcoming = select([shows.c.venue_id, func.count(shows.c.id), func.min(shows.c.time)]) \
+              .where(shows.c.venue_id.in_(venue_ids)) \
+              .where(shows.c.time > datetime.now()) \
+              .group_by(shows.c.venue_id)
+  connection.execute(summary.insert().from_select(
+    ['venue_id', 'num_upcoming_shows', 'next_show_time'], upcoming))
+
+#  ----------------------------------------------------------------  
+#  Keep the summary in sync when shows are written
+#  ----------------------------------------------------------------
+def showVenueIds(show):
+  venue_ids = [show.venue_id]
+  history = inspect(show).attrs.venue_id.history
+  if history.deleted:
+    venue_ids.extend(history.deleted)
+  return venue_ids
+
+@event.listens_for(Show, 'after_insert')
+@event.listens_for(Show, 'after_update')
+@event.listens_for(Show, 'after_delete')
+def showChanged(mapper, connection, target):
+  if app.config.get('USE_VENUE_SUMMARY'):
+    refreshVenueSummary(connection, showVenueIds(target))
+
+#  ----------------------------------------------------------------  
+#  All venues grouped by state and city, with their number of
+#  upcoming shows, from a single grouped query
+#  ----------------------------------------------------------------
+def getVenueAreas(genre=None):
+  now = datetime.now()
+
+  if app.config.get('USE_VENUE_SUMMARY'):
+    # refresh the venues whose next show has started since the last refresh,
+    # on the primary: the refresh writes, even during a GET
+    with use_primary():
+      stale = db.session.query(VenueShowSummary.venue_id) \
+                        .filter(VenueShowSummary.next_show_time <= now) \
+                        .all()
+      if len(stale) > 0:
+        refreshVenueSummary(db.session.connection(), [row.venue_id for row in stale])
+        db.session.commit()
+
+    upcoming = db.session.query(VenueShowSummary.venue_id.label('venue_id'),
+                                VenueShowSummary.num_upcoming_shows.label('num_upcoming_shows')) \
+                         .subquery()
+  else:
+    upcoming = db.session.query(Show.venue_id.label('venue_id'),
+                                func.count(Show.id).label('num_upcoming_shows')) \
+                         .filter(Show.time > now) \
+                         .group_by(Show.venue_id) \
+                         .subquery()
+
+  venues = db.session.query(Venue.id,
+                            Venue.name,
+                            Venue.city,
+                            Venue.state,
+                            func.coalesce(upcoming.c.num_upcoming_shows, 0).label('num_upcoming_shows')) \
+                     .outerjoin(upcoming, upcoming.c.venue_id == Venue.id)
+
+  # only the venues of a genre, through the venue_genre index
+  if genre is not None:
+    venues = venues.filter(Venue.genres.any(Genre.name == genre))
+
+  venues = venues.order_by(Venue.state, Venue.city, Venue.name).all()
+
+  areas = []
+  for (state, city), area_venues in groupby(venues, key=lambda venue: (venue.state, venue.city)):
+    areas.append({
+      'state': state,
+      'city': city,
+      'venues': [{
+        'id': venue.id,
+        'name': venue.name,
+        'city': venue.city,
+        'num_upcoming_shows': venue.num_upcoming_shows
+      } for venue in area_venues]
+    })
+
+  return areas
+
+#  ----------------------------------------------------------------  
+#  Delete a venue or an artist with all its shows
+#  A few set based DELETE statements, run in the session transaction.
+#  With USE_DB_CASCADE the foreign keys are ON DELETE CASCADE (see
+#  migration 2d7b8e41c6f3, and app.py for SQLite) and deleting the
+#  venue or artist is enough
+#  ----------------------------------------------------------------
+def deleteVenueCascade(venue_id):
+  if not app.config.get('USE_DB_CASCADE'):
+    show_ids = select([Show.id]).where(Show.venue_id == venue_id)
+    db.session.execute(show_artist.delete().where(show_artist.c.show_id.in_(show_ids)))
+    db.session.execute(show_venue.delete().where((show_venue.c.venu_id == venue_id) |
+                                                 show_venue.c.show_id.in_(show_ids)))
+    db.session.execute(VenueShowSummary.__table__.delete().where(VenueShowSummary.venue_id == venue_id))
+    db.session.execute(venue_genre.delete().where(venue_genre.c.venue_id == venue_id))
+    db.session.execute(Show.__table__.delete().where(Show.venue_id == venue_id))
+
+  return db.session.execute(Venue.__table__.delete().where(Venue.id == venue_id)).rowcount
+
+def deleteArtistCascade(artist_id):
+  venue_ids = []
+  if app.config.get('USE_VENUE_SUMMARY'):
+    venue_ids = [row.venue_id for row in
+                  db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
+
+  if not app.config.get('USE_DB_CASCADE'):
+    show_ids = select([Show.id]).where(Show.artist_id == artist_id)
+    db.session.execute(show_venue.delete().where(show_venue.c.show_id.in_(show_ids)))
+    db.session.execute(show_artist.delete().where((show_artist.c.artist_id == artist_id) |
+                                                  show_artist.c.show_id.in_(show_ids)))
+    db.session.execute(artist_genre.delete().where(artist_genre.c.artist_id == artist_id))
+    db.session.execute(Show.__table__.delete().where(Show.artist_id == artist_id))
+
+  deleted = db.session.execute(Artist.__table__.delete().where(Artist.id == artist_id)).rowcount
+  refreshVenueSummary(db.session.connection(), venue_ids)
+  return deleted
+
 #  ----------------------------------------------------------------  
 #  Get all shows for a venue id
 #  ----------------------------------------------------------------
@@ -102,30 +300,83 @@ def getShowsWithArtistId(artist_id):
 
 #  ----------------------------------------------------------------  
 #  Get all shows for a venue or artist id
+#  Shows, the name and image of the other side of each show, and
+#  whether the show is upcoming all come from one joined query
 #  ----------------------------------------------------------------
 def getShowsWithId(itme_id, model:db.Model):
 
   if isinstance(model, Artist):
-    shows = Show.query.filter(Show.artist_id == itme_id)
+    counterpart = Venue
+    show_filter = Show.artist_id == itme_id
+    counterpart_join = Show.venue_id == Venue.id
   else:
-    shows = Show.query.filter(Show.venue_id == itme_id)
-  
+    counterpart = Artist
+    show_filter = Show.venue_id == itme_id
+    counterpart_join = Show.artist_id == Artist.id
+
   now = datetime.now()
+  is_upcoming = case([(Show.time > now, True)], else_=False).label('is_upcoming')
+
+  shows = db.session.query(Show.time,
+                           Show.venue_id,
+                           Show.artist_id,
+                           counterpart.name,
+                           counterpart.image_link,
+                           is_upcoming) \
+                    .outerjoin(counterpart, counterpart_join) \
+                    .filter(show_filter) \
+                    .order_by(Show.time) \
+                    .all()
+
   future_shows = []
   past_shows = []
 
-  if shows is not None:
-    for one_show in shows:
-      show_item = viewItemForAShow(one_show, model)
-      if one_show.time > now: 
-        future_shows.append(show_item)
-      else:
-        past_shows.append(show_item)
+  for one_show in shows:
+    show_item = viewItemForAShow(one_show, model)
+    if one_show.is_upcoming:
+      future_shows.append(show_item)
+    else:
+      past_shows.append(show_item)
   
   return past_shows, future_shows
 
 #  ----------------------------------------------------------------  
-#  Convert a show object to displayable object
+#  One page of the upcoming shows feed
+#  Shows are ordered by (time, id) and the page starts right after
+#  the (time, id) cursor of the previous page, so deep pages stay as
+#  cheap as the first one. Venue and artist come from the same query.
+#  Returns the shows and the cursor of the next page, or None
+#  ----------------------------------------------------------------
+SHOWS_PER_PAGE = 24
+
+def getUpcomingShows(after=None, per_page=SHOWS_PER_PAGE):
+  query = db.session.query(Show.id,
+                           Show.time,
+                           Show.venue_id,
+                           Venue.name.label('venue_name'),
+                           Show.artist_id,
+                           Artist.name.label('artist_name'),
+                           Artist.image_link.label('artist_image_link')) \
+                    .outerjoin(Venue, Show.venue_id == Venue.id) \
+                    .outerjoin(Artist, Show.artist_id == Artist.id) \
+                    .filter(Show.time > datetime.now())
+
+  if after is not None:
+    after_time, after_id = after
+    query = query.filter(Show.time >= after_time,
+                         or_(Show.time > after_time, Show.id > after_id))
+
+  shows = query.order_by(Show.time, Show.id).limit(per_page + 1).all()
+
+  next_cursor = None
+  if len(shows) > per_page:
+    shows = shows[:per_page]
+    next_cursor = encodeCursor(shows[-1].time, shows[-1].id)
+
+  return shows, next_cursor
+
+#  ----------------------------------------------------------------  
+#  Convert a show row (from getShowsWithId) to displayable object
 #  ----------------------------------------------------------------
 def viewItemForAShow(show, model: db.Model):
   view_item = dict()
@@ -133,15 +384,13 @@ def viewItemForAShow(show, model: db.Model):
 
   if isinstance(model, Artist):
     view_item['venue_id'] = show.venue_id
-    venue = Venue.query.get(show.venue_id)
-    if venue is not None:
-      view_item['venue_name'] = venue.name
-      view_item['venue_image_link'] = venue.image_link
+    if show.name is not None:
+      view_item['venue_name'] = show.name
+      view_item['venue_image_link'] = show.image_link
   else:
     view_item['artist_id'] = show.artist_id
-    artist = Artist.query.get(show.artist_id)
-    if artist is not None: 
-      view_item['artist_name'] = artist.name
-      view_item['artist_image_link'] = artist.image_link
+    if show.name is not None: 
+      view_item['artist_name'] = show.name
+      view_item['artist_image_link'] = show.image_link
   
-  return view_item
\ No newline at end of file
+  return view_item
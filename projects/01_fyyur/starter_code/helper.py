@@ -3,26 +3,19 @@ import dateutil.parser
 import babel
 
 def arrayToString(stringlist): 
-    if len(stringlist) == 0:
-        return ""
-
-    result = ""
-    for oneString in stringlist: 
-        result += (oneString + ",")
-
-    return result
+    return ",".join(stringlist)
 
 def stringToArray(stringValue):
     if stringValue is None or len(stringValue) == 0:
         return [""]
 
-    if "," in stringValue:
-        return stringValue.split(",")
-    else:
-        return [stringValue]
+    return [oneString for oneString in stringValue.split(",") if len(oneString) > 0]
 
 def format_datetime(stringValue, format='medium'):
-  date = dateutil.parser.parse(stringValue)
+  if isinstance(stringValue, datetime):
+      date = stringValue
+  else:
+      date = dateutil.parser.parse(stringValue)
   if format == 'full':
       format="EEEE MMMM, d, y 'at' h:mma"
   elif format == 'medium':
@@ -31,4 +24,12 @@ def format_datetime(stringValue, format='medium'):
 
 def dateTimeToString(dateTime):
     format="%a %-d %b %Y 'at' %H:%M"
-    return dateTime.strftime(format)
\ No newline at end of file
+    return dateTime.strftime(format)
+
+def encodeCursor(dateTime, id):
+    return "{}_{}".format(dateTime.isoformat(), id)
+
+def decodeCursor(cursor):
+    # raises ValueError when the cursor was not made by encodeCursor
+    dateTimeValue, id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(dateTimeValue), int(id)
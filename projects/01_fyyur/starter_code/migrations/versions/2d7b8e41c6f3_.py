@@ -0,0 +1,49 @@
+"""on delete cascade for shows
+
+Revision ID: 2d7b8e41c6f3
+Revises: 9c3e6b1d7a20
+Create Date: 2026-10-18 11:48:05.216934
+
+SQLite can not alter constraints: its tables get the cascades from
+db.create_all(), and SQLite only applies them on connections with
+PRAGMA foreign_keys=ON, which app.py turns on for every connection.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d7b8e41c6f3'
+down_revision = '9c3e6b1d7a20'
+branch_labels = None
+depends_on = None
+
+# (constraint, table, referred table, column)
+FOREIGN_KEYS = [
+    ('Show_venue_id_fkey', 'Show', 'Venue', 'venue_id'),
+    ('Show_artist_id_fkey', 'Show', 'Artist', 'artist_id'),
+    ('show_artist_artist_id_fkey', 'show_artist', 'Artist', 'artist_id'),
+    ('show_artist_show_id_fkey', 'show_artist', 'Show', 'show_id'),
+    ('show_venue_venu_id_fkey', 'show_venue', 'Venue', 'venu_id'),
+    ('show_venue_show_id_fkey', 'show_venue', 'Show', 'show_id'),
+]
+
+
+def recreate_foreign_keys(ondelete):
+    for name, table, referred, column in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    # SQLite can not alter constraints, see above
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    recreate_foreign_keys(None)
@@ -0,0 +1,40 @@
+"""venue show summary
+
+Revision ID: 5a1f0c7d2e94
+Revises: 3bac3c4659d2
+Create Date: 2026-10-18 10:12:31.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1f0c7d2e94'
+down_revision = '3bac3c4659d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('venue_show_summary',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('num_upcoming_shows', sa.Integer(), nullable=False),
+    sa.Column('next_show_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id')
+    )
+    op.create_index(op.f('ix_venue_show_summary_next_show_time'), 'venue_show_summary', ['next_show_time'], unique=False)
+
+    # fill the summary with the shows which already exist
+    op.execute(
+        'INSERT INTO venue_show_summary (venue_id, num_upcoming_shows, next_show_time) '
+        'SELECT venue_id, count(id), min(time) FROM "Show" '
+        'WHERE venue_id IS NOT NULL AND time > CURRENT_TIMESTAMP '
+        'GROUP BY venue_id'
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_venue_show_summary_next_show_time'), table_name='venue_show_summary')
+    op.drop_table('venue_show_summary')
@@ -0,0 +1,45 @@
+"""trigram search indexes
+
+Revision ID: 9c3e6b1d7a20
+Revises: 5a1f0c7d2e94
+Create Date: 2026-10-18 11:02:47.730115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e6b1d7a20'
+down_revision = '5a1f0c7d2e94'
+branch_labels = None
+depends_on = None
+
+# columns searched by search.searchItems, with lower(...) LIKE '%term%'
+SEARCHED_COLUMNS = [
+    ('Venue', 'name'), ('Venue', 'city'), ('Venue', 'state'),
+    ('Artist', 'name'), ('Artist', 'city'), ('Artist', 'state'),
+]
+
+
+def index_name(table, column):
+    return 'ix_{}_{}_trgm'.format(table, column)
+
+
+def upgrade():
+    # trigram indexes only exist on Postgres, other databases scan the table
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in SEARCHED_COLUMNS:
+        op.execute('CREATE INDEX {} ON "{}" USING gin (lower("{}") gin_trgm_ops)'.format(
+            index_name(table, column), table, column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table, column in SEARCHED_COLUMNS:
+        op.execute('DROP INDEX IF EXISTS {}'.format(index_name(table, column)))
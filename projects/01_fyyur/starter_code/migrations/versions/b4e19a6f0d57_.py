@@ -0,0 +1,103 @@
+"""normalized genres
+
+Revision ID: b4e19a6f0d57
+Revises: 2d7b8e41c6f3
+Create Date: 2026-10-18 12:37:52.904561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e19a6f0d57'
+down_revision = '2d7b8e41c6f3'
+branch_labels = None
+depends_on = None
+
+# (owner table, link table, link column)
+OWNERS = [
+    ('Artist', 'artist_genre', 'artist_id'),
+    ('Venue', 'venue_genre', 'venue_id'),
+]
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_Genre_name'), 'Genre', ['name'], unique=True)
+    op.create_table('artist_genre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_artist_genre_genre_id'), 'artist_genre', ['genre_id'], unique=False)
+    op.create_table('venue_genre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_venue_genre_genre_id'), 'venue_genre', ['genre_id'], unique=False)
+
+    # move the comma joined genres strings into the new tables
+    connection = op.get_bind()
+    genre_table = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    genre_ids = {}
+
+    for owner, link, link_column in OWNERS:
+        owner_table = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        link_table = sa.table(link, sa.column(link_column, sa.Integer), sa.column('genre_id', sa.Integer))
+
+        links = []
+        for owner_id, genres in connection.execute(sa.select([owner_table.c.id, owner_table.c.genres])):
+            names = set(name.strip() for name in (genres or '').split(','))
+            for name in sorted(name for name in names if len(name) > 0):
+                if name not in genre_ids:
+                    connection.execute(genre_table.insert().values(name=name))
+                    genre_ids[name] = connection.execute(
+                        sa.select([genre_table.c.id]).where(genre_table.c.name == name)).scalar()
+                links.append({link_column: owner_id, 'genre_id': genre_ids[name]})
+
+        if len(links) > 0:
+            connection.execute(link_table.insert(), links)
+
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    genre_table = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+    for owner, link, link_column in OWNERS:
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.VARCHAR(length=120), autoincrement=False, nullable=True))
+
+        owner_table = sa.table(owner, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        link_table = sa.table(link, sa.column(link_column, sa.Integer), sa.column('genre_id', sa.Integer))
+
+        genres = {}
+        rows = connection.execute(sa.select([link_table.c[link_column], genre_table.c.name])
+                                    .select_from(link_table.join(genre_table, link_table.c.genre_id == genre_table.c.id))
+                                    .order_by(genre_table.c.name))
+        for owner_id, name in rows:
+            genres.setdefault(owner_id, []).append(name)
+
+        for owner_id, names in genres.items():
+            connection.execute(owner_table.update()
+                                .where(owner_table.c.id == owner_id)
+                                .values(genres=','.join(names)))
+
+    op.drop_index(op.f('ix_venue_genre_genre_id'), table_name='venue_genre')
+    op.drop_table('venue_genre')
+    op.drop_index(op.f('ix_artist_genre_genre_id'), table_name='artist_genre')
+    op.drop_table('artist_genre')
+    op.drop_index(op.f('ix_Genre_name'), table_name='Genre')
+    op.drop_table('Genre')
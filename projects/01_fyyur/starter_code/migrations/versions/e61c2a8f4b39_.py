@@ -0,0 +1,24 @@
+"""show time index for the upcoming shows feed
+
+Revision ID: e61c2a8f4b39
+Revises: b4e19a6f0d57
+Create Date: 2026-10-18 13:05:41.377120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61c2a8f4b39'
+down_revision = 'b4e19a6f0d57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_time_id', 'Show', ['time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_time_id', table_name='Show')
@@ -5,6 +5,8 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
 from forms import *
 from db_models_setup import *
+from search import searchItems
+from fsnd_common.routing import replica_reads
 
 #  ----------------------------------------------------------------  
 #  Show a list of artists
@@ -12,7 +14,14 @@ from db_models_setup import *
 @app.route('/artists')
 def artists():
   # TODO: replace with real data returned from querying the database
-  artists = Artist.query.with_entities(Artist.id, Artist.name).order_by(Artist.name).all()
+  artists = Artist.query.with_entities(Artist.id, Artist.name)
+
+  # only the artists of a genre, through the artist_genre index
+  genre = request.args.get('genre')
+  if genre is not None:
+    artists = artists.filter(Artist.genres.any(Genre.name == genre))
+
+  artists = artists.order_by(Artist.name).all()
 
   return render_template('pages/artists.html', artists=artists)
 
@@ -34,7 +43,7 @@ def show_artist(artist_id):
   data = dict()
   data['id'] = artist.id
   data['name'] = artist.name
-  data['genres'] = stringToArray(artist.genres)
+  data['genres'] = genreNames(artist)
   data['image_link'] = artist.image_link
   data['city'] = artist.city
   data['state'] = artist.state
@@ -59,7 +68,7 @@ def edit_artist(artist_id):
   artist = {
     "id": data.id,
     "name": data.name,
-    "genres": stringToArray(data.genres),
+    "genres": genreNames(data),
     "city": data.city,
     "state": data.state,
     "phone": data.phone,
@@ -90,7 +99,7 @@ def edit_artist_submission(artist_id):
     artist.phone = form.phone.data
     artist.city = form.city.data
     artist.state = form.state.data
-    artist.genres = arrayToString(form.genres.data)
+    artist.genres = genresFromNames(form.genres.data)
     artist.image_link = form.image_link.data
     artist.facebook_link = form.facebook_link.data
     db.session.commit()
@@ -132,7 +141,8 @@ def create_artist_submission():
     artist = Artist(name=form.name.data, 
                     city=form.city.data, 
                     state=form.state.data,
-                    phone=form.phone.data)
+                    phone=form.phone.data,
+                    genres=genresFromNames(form.genres.data))
     db.session.add(artist)
     db.session.commit()
   except:
@@ -156,31 +166,19 @@ def create_artist_submission():
 #  Search artists
 #  ----------------------------------------------------------------
 @app.route('/artists/search', methods=['POST'])
+@replica_reads
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
 
   keyWords = request.form.get('search_term', '')
-  likeWords = "%" + keyWords + "%"
-
-  result = Artist.query.filter(Artist.name.ilike(likeWords) | 
-                               Artist.city.ilike(likeWords) | 
-                               Artist.state.ilike(likeWords)).order_by(Artist.name).all()
-
-  viewItems = []
-  if len(result) > 0:
-    for oneResult in result:
-      oneDic = dict()
-      oneDic['id'] = oneResult.id
-      oneDic['name'] = oneResult.name
-      oneDic['num_upcoming_shows'] = 0
-      viewItems.append(oneDic)
-
-  response = {
-    "count": len(result),
-    "data": viewItems
-  }
+  page = request.form.get('page', 1, type=int)
+  if page < 1:
+    page = 1
+
+  genre = request.form.get('genre') or None
+  response = searchItems(Artist, keyWords, page, genre=genre)
 
   return render_template('pages/search_artists.html', results=response, search_term=keyWords)
 
@@ -196,27 +194,10 @@ def delete_artist(artist_id):
       artist = Artist.query.get(artist_id)
       artist_name = artist.name
 
-      for show in artist.shows:
-        artist.shows.remove(show)
-
-      # Show table
-      shows = Show.query.filter(Show.artist_id==artist_id)
-      showIds = [oneShow.id for oneShow in shows]
-
-      # clean Venue table
-      for oneShow in shows:
-        venue = Venue.query.get(oneShow.venue_id)
-        for venueShow in venue.shows:
-          if venueShow.id in showIds:
-            venue.shows.remove(venueShow)
-      
-      # clean Show table
-      shows.delete()
-      
-      # clean Artist table
-      db.session.delete(artist)
+      # shows, their links and the artist go in a few DELETE statements
+      deleteArtistCascade(artist_id)
       db.session.commit()
-  except():
+  except:
       db.session.rollback()
       error = True
   finally:
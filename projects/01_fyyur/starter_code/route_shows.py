@@ -1,5 +1,5 @@
 from app import *
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
@@ -13,26 +13,37 @@ from datetime import *
 #  ----------------------------------------------------------------
 @app.route('/shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
+  # displays the upcoming shows at /shows, one page at a time.
+  # ?after=<cursor> continues after the last show of the previous page
+  # and ?format=json returns the same page as json
+  after = request.args.get('after')
+  try:
+    cursor = decodeCursor(after) if after else None
+  except ValueError:
+    abort(400)
 
-  presentShows = []
-  now = datetime.now()
-  shows = Show.query.filter(Show.time > now).order_by(Show.time).all()
+  rows, next_cursor = getUpcomingShows(cursor)
 
-  for oneShow in shows:
+  presentShows = []
+  for oneShow in rows:
     data = {
       "venue_id": oneShow.venue_id,
-      "venue_name": oneShow.venues[0].name,
+      "venue_name": oneShow.venue_name,
       "artist_id": oneShow.artist_id,
-      "artist_name": oneShow.artists[0].name,
-      "artist_image_link": oneShow.artists[0].image_link,
-      "start_time": dateTimeToString(oneShow.time)
+      "artist_name": oneShow.artist_name,
+      "artist_image_link": oneShow.artist_image_link,
+      "start_time": oneShow.time
     }
     presentShows.append(data)
 
-  return render_template('pages/shows.html', shows=presentShows)
+  if request.args.get('format') == 'json':
+    # start_time is written as ISO 8601 by the json provider
+    return jsonify({
+      "shows": presentShows,
+      "next": next_cursor
+    })
+
+  return render_template('pages/shows.html', shows=presentShows, next_cursor=next_cursor)
 
 #  ----------------------------------------------------------------  
 #  Create a new show -UI
@@ -5,6 +5,8 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
 from forms import *
 from db_models_setup import *
+from search import searchItems
+from fsnd_common.routing import replica_reads
 from datetime import *
 
 #  ----------------------------------------------------------------  
@@ -15,31 +17,8 @@ def venues():
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
 
-  resultData = []
-
-  # find all the states from Venue table
-  states = Venue.query.with_entities(Venue.state, func.count(Venue.city)).group_by(Venue.state).all()
-
-  # Loop through each state
-  for oneState in states:
-
-    # all the cities for one state
-    stateCitys = Venue.query.filter(Venue.state==oneState[0]).all()
-    
-    oneData = dict()
-    oneData['state'] = oneState[0]
-
-    subVenues = []
-    for oneCity in stateCitys:
-      aVenue = dict()
-      aVenue['id'] = oneCity.id
-      aVenue['name'] = oneCity.name
-      aVenue['city'] = oneCity.city
-      aVenue['num_upcoming_shows'] = 0
-      subVenues.append(aVenue)
-    
-    oneData['venues'] = subVenues
-    resultData.append(oneData)
+  # venues bucketed by (state, city), with their upcoming show counts
+  resultData = getVenueAreas(request.args.get('genre'))
 
   return render_template('pages/venues.html', areas=resultData)
 
@@ -66,7 +45,8 @@ def create_venue_submission():
                   city=form['city'], 
                   state=form['state'],
                   address=form['address'],
-                  phone=form['phone'])
+                  phone=form['phone'],
+                  genres=genresFromNames(form.getlist('genres')))
  
     db.session.add(venu)
     db.session.commit()
@@ -86,30 +66,18 @@ def create_venue_submission():
 #  Search venues
 #  ---------------------------------------------------------------- 
 @app.route('/venues/search', methods=['POST'])
+@replica_reads
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
   keyWords = request.form.get('search_term', '')
-  likeWords = "%" + keyWords + "%"
-
-  result = Venue.query.filter(Venue.name.ilike(likeWords) | 
-                              Venue.city.ilike(likeWords) | 
-                              Venue.state.ilike(likeWords)).order_by(Venue.name).all()
-
-  viewItems = []
-  if len(result) > 0:
-    for oneResult in result:
-      oneDic = dict()
-      oneDic['id'] = oneResult.id
-      oneDic['name'] = oneResult.name
-      oneDic['num_upcoming_shows'] = 0
-      viewItems.append(oneDic)
-
-  response = {
-    "count": len(result),
-    "data": viewItems
-  }
+  page = request.form.get('page', 1, type=int)
+  if page < 1:
+    page = 1
+
+  genre = request.form.get('genre') or None
+  response = searchItems(Venue, keyWords, page, genre=genre)
 
   return render_template('pages/search_venues.html', results=response, search_term=keyWords)
 
@@ -131,7 +99,7 @@ def show_venue(venue_id):
   data = dict()
   data['id'] = venue.id
   data['name'] = venue.name
-  data['genres'] = stringToArray(venue.genres)
+  data['genres'] = genreNames(venue)
   data['address'] = venue.address
   data['city'] = venue.city
   data['state'] = venue.state
@@ -148,7 +116,7 @@ def show_venue(venue_id):
 #  ----------------------------------------------------------------  
 # Delete a venue
 #  ----------------------------------------------------------------  
-@app.route('/venues/<venue_id>/delete', methods=['POST'])
+@app.route('/venues/<int:venue_id>/delete', methods=['POST'])
 def delete_venue(venue_id):
   # TODO: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
@@ -162,27 +130,10 @@ def delete_venue(venue_id):
       venue = Venue.query.get(venue_id)
       venue_name = venue.name
 
-      for show in venue.shows:
-        venue.shows.remove(show)
-
-      # Show table
-      shows = Show.query.filter(Show.venue_id==venue_id)
-      showIds = [oneShow.id for oneShow in shows]
-
-      # clean Artist table
-      for oneShow in shows:
-        artist = Artist.query.get(oneShow.artist_id)
-        for artistShow in artist.shows:
-          if artistShow.id in showIds:
-            artist.shows.remove(artistShow)
-
-      # clean Show table
-      shows.delete()
-      
-      # clean Venue table
-      db.session.delete(venue)
+      # shows, their links and the venue go in a few DELETE statements
+      deleteVenueCascade(venue_id)
       db.session.commit()
-  except():
+  except:
       db.session.rollback()
       error = True
   finally:
@@ -191,7 +142,7 @@ def delete_venue(venue_id):
   if error:
     flash(sys.exc_info())
   else:
-    flash('Venue ' + venue_name + 'deleted!')
+    flash('Venue ' + venue_name + ' deleted!')
   
   return render_template('pages/home.html')
 
@@ -206,7 +157,7 @@ def edit_venue(venue_id):
   venue = {
     "id": data.id,
     "name": data.name,
-    "genres": stringToArray(data.genres),
+    "genres": genreNames(data),
     "city": data.city,
     "state": data.state,
     "phone": data.phone,
@@ -235,7 +186,7 @@ def edit_venue_submission(venue_id):
     venue.phone = form.phone.data
     venue.city = form.city.data
     venue.state = form.state.data
-    venue.genres = arrayToString(form.genres.data)
+    venue.genres = genresFromNames(form.genres.data)
     venue.image_link = form.image_link.data
     venue.facebook_link = form.facebook_link.data
     db.session.commit()
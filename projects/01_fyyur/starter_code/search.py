@@ -0,0 +1,74 @@
+from app import db
+from sqlalchemy import func, case, or_
+from datetime import datetime
+from db_models_setup import Show, Artist, Venue, Genre
+
+SEARCH_RESULTS_PER_PAGE = 10
+
+#  ----------------------------------------------------------------  
+#  Search venues or artists by name, city and state
+#  Case-insensitive partial match, served by the trigram indexes on
+#  Postgres (see migration 9c3e6b1d7a20) and by a plain scan on SQLite.
+#  Results are ranked by relevance:
+#    exact name > name prefix > name contains > city or state contains
+#  then by name, and come with their number of upcoming shows.
+#  `genre` keeps only the venues or artists of that genre
+#  ----------------------------------------------------------------
+LIKE_ESCAPE = '\\'
+
+def escapeLike(term):
+  # % and _ typed by the user are matched literally
+  return term.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2) \
+             .replace('%', LIKE_ESCAPE + '%') \
+             .replace('_', LIKE_ESCAPE + '_')
+
+def searchItems(model, search_term, page=1, per_page=SEARCH_RESULTS_PER_PAGE, genre=None):
+  term = search_term.strip().lower()
+  prefix = escapeLike(term) + '%'
+  contains = '%' + prefix
+
+  name = func.lower(model.name)
+  matches = or_(name.like(contains, escape=LIKE_ESCAPE),
+                func.lower(model.city).like(contains, escape=LIKE_ESCAPE),
+                func.lower(model.state).like(contains, escape=LIKE_ESCAPE))
+  if genre is not None:
+    matches = matches & model.genres.any(Genre.name == genre)
+
+  relevance = case([(name == term, 4),
+                    (name.like(prefix, escape=LIKE_ESCAPE), 3),
+                    (name.like(contains, escape=LIKE_ESCAPE), 2)],
+                   else_=1).label('relevance')
+
+  if model is Venue:
+    show_owner = Show.venue_id
+  else:
+    show_owner = Show.artist_id
+
+  # counted for the rows of the page only
+  upcoming = db.session.query(func.count(Show.id)) \
+                       .filter(show_owner == model.id, Show.time > datetime.now()) \
+                       .correlate(model) \
+                       .as_scalar()
+
+  count = db.session.query(func.count(model.id)).filter(matches).scalar()
+
+  results = db.session.query(model.id,
+                             model.name,
+                             upcoming.label('num_upcoming_shows'),
+                             relevance) \
+                      .filter(matches) \
+                      .order_by(relevance.desc(), model.name, model.id) \
+                      .offset((page - 1) * per_page) \
+                      .limit(per_page) \
+                      .all()
+
+  return {
+    "count": count,
+    "page": page,
+    "has_next": page * per_page < count,
+    "data": [{
+      'id': result.id,
+      'name': result.name,
+      'num_upcoming_shows': result.num_upcoming_shows
+    } for result in results]
+  }
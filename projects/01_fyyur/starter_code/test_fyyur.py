@@ -0,0 +1,409 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from flask import g
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine.url import make_url
+
+# the tests run against their own database, set DATABASE_URL before app is imported
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost:5432/fyyur_test')
+
+from app import app, db
+from db_models_setup import Show, Artist, Venue, Genre, VenueShowSummary, getVenueAreas, getUpcomingShows, genresFromNames, genreNames, show_artist, show_venue
+from search import searchItems
+from helper import encodeCursor, decodeCursor
+
+
+class QueryCounter:
+    """Counts the SQL statements executed while it is active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and create a venue and an artist with many shows."""
+        self.client = app.test_client
+        db.create_all()
+
+        self.venue = Venue(name='Mock Venue', city='San Francisco', state='CA')
+        self.artist = Artist(name='Mock Artist', city='San Francisco', state='CA')
+        db.session.add_all([self.venue, self.artist])
+
+        # every show of the venue is with another artist, and the other way round
+        now = datetime.now()
+        for index in range(30):
+            other_artist = Artist(name='Mock Artist {}'.format(index), image_link='http://image/{}'.format(index))
+            other_venue = Venue(name='Mock Venue {}'.format(index), city='Oakland', state='CA')
+            db.session.add_all([other_artist, other_venue])
+            db.session.flush()
+
+            time = now + timedelta(days=index - 10, hours=12)
+            self.add_show(self.venue, other_artist, time)
+            self.add_show(other_venue, self.artist, time)
+        db.session.commit()
+
+        self.venue_id = self.venue.id
+        self.artist_id = self.artist.id
+
+    def add_show(self, venue, artist, time):
+        show = Show(venue_id=venue.id, artist_id=artist.id, time=time)
+        venue.shows.append(show)
+        artist.shows.append(show)
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        db.drop_all()
+
+    def count_queries(self, url):
+        with QueryCounter(db.engine) as counter:
+            res = self.client().get(url)
+        self.assertEqual(res.status_code, 200)
+        return counter.count
+
+    # detail pages must not issue one query per show
+    def test_show_venue_query_count(self):
+        self.assertLessEqual(self.count_queries('/venues/{}'.format(self.venue_id)), 2)
+
+    def test_show_artist_query_count(self):
+        self.assertLessEqual(self.count_queries('/artists/{}'.format(self.artist_id)), 2)
+
+    def test_venues_query_count(self):
+        self.assertLessEqual(self.count_queries('/venues'), 1)
+
+    def test_venues_upcoming_counts(self):
+        areas = getVenueAreas()
+        venues = [venue for area in areas for venue in area['venues']]
+        counts = dict((venue['id'], venue['num_upcoming_shows']) for venue in venues)
+
+        self.assertEqual(counts[self.venue_id], 20)
+        self.assertEqual(len(areas), 2)
+
+    def test_venues_summary_table(self):
+        app.config['USE_VENUE_SUMMARY'] = True
+        self.addCleanup(app.config.update, USE_VENUE_SUMMARY=False)
+
+        # refreshed when a show is added
+        artist = Artist(name='Summary Artist')
+        db.session.add(artist)
+        db.session.flush()
+        self.add_show(self.venue, artist, datetime.now() + timedelta(days=1))
+        db.session.commit()
+
+        self.assertLessEqual(self.count_queries('/venues'), 2)
+        summary = VenueShowSummary.query.get(self.venue_id)
+        self.assertEqual(summary.num_upcoming_shows, 21)
+
+    # search
+    def test_search_venues_ranked(self):
+        results = searchItems(Venue, 'mock venue 1', per_page=5)
+
+        # 'Mock Venue 1' is an exact match, 'Mock Venue 10'... only start with it
+        self.assertEqual(results['count'], 11)
+        self.assertEqual(len(results['data']), 5)
+        self.assertEqual(results['data'][0]['name'], 'Mock Venue 1')
+        self.assertTrue(results['has_next'])
+
+    def test_search_artists_upcoming_shows(self):
+        results = searchItems(Artist, 'Mock Artist')
+        counts = dict((artist['name'], artist['num_upcoming_shows']) for artist in results['data'])
+
+        self.assertEqual(results['data'][0]['name'], 'Mock Artist')
+        self.assertEqual(counts['Mock Artist'], 20)
+
+    def test_search_by_city(self):
+        results = searchItems(Venue, 'oakland', page=4)
+
+        self.assertEqual(results['count'], 30)
+        self.assertEqual(len(results['data']), 0)
+
+    def test_search_wildcards_are_literal(self):
+        db.session.add(Venue(name='100% Jazz_Club', city='Oakland', state='CA'))
+        db.session.commit()
+
+        self.assertEqual(searchItems(Venue, '%')['count'], 1)
+        self.assertEqual(searchItems(Venue, 'z_c')['count'], 1)
+        self.assertEqual(searchItems(Venue, 'mock_venue')['count'], 0)
+        self.assertEqual(searchItems(Venue, '\\')['count'], 0)
+
+    def test_search_upcoming_shows_of_page(self):
+        results = searchItems(Venue, 'mock venue 1', per_page=5)
+        counts = dict((venue['name'], venue['num_upcoming_shows']) for venue in results['data'])
+
+        # Mock Venue 10... host a show of the artist each, from day 0 on
+        self.assertEqual(counts['Mock Venue 1'], 0)
+        self.assertEqual(counts['Mock Venue 10'], 1)
+
+    def test_search_venues_page(self):
+        res = self.client().post('/venues/search', data={'search_term': 'Mock', 'page': 2})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Page 2', res.data.decode('utf-8'))
+
+    # genres
+    def add_genres(self):
+        jazz, rock = genresFromNames(['Jazz', 'Rock'])
+        self.venue.genres = [jazz, rock]
+        self.artist.genres = [jazz]
+        Artist.query.filter(Artist.name == 'Mock Artist 3').one().genres = [rock]
+        db.session.commit()
+
+    def test_genres_are_shared(self):
+        self.add_genres()
+
+        self.assertEqual(Genre.query.count(), 2)
+        self.assertEqual(genreNames(self.venue), ['Jazz', 'Rock'])
+        blues, rock = genresFromNames(['Rock', ' Blues', ''])
+        self.assertEqual(rock.id, self.venue.genres[1].id)
+        self.assertIsNone(blues.id)
+
+    def test_venues_by_genre(self):
+        self.add_genres()
+        areas = getVenueAreas('Jazz')
+
+        self.assertEqual([venue['id'] for area in areas for venue in area['venues']], [self.venue_id])
+        self.assertEqual(getVenueAreas('Polka'), [])
+
+    def test_artists_by_genre(self):
+        self.add_genres()
+        res = self.client().get('/artists?genre=Rock')
+        page = res.data.decode('utf-8')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Mock Artist 3', page)
+        self.assertNotIn('Mock Artist 4', page)
+
+    def test_search_by_genre(self):
+        self.add_genres()
+        results = searchItems(Artist, 'mock', genre='Rock')
+
+        self.assertEqual(results['count'], 1)
+        self.assertEqual(results['data'][0]['name'], 'Mock Artist 3')
+
+    # upcoming shows feed
+    def test_shows_feed_pages(self):
+        seen = []
+        after = None
+        while True:
+            shows, after = getUpcomingShows(after and decodeCursor(after), per_page=7)
+            seen.extend(show.id for show in shows)
+            if after is None:
+                break
+
+        upcoming = Show.query.filter(Show.time > datetime.now()).order_by(Show.time, Show.id).all()
+        self.assertEqual(seen, [show.id for show in upcoming])
+        self.assertEqual(len(seen), 40)
+
+    def test_shows_feed_same_time(self):
+        # shows at the same time are paged by id
+        time = datetime.now() + timedelta(days=100)
+        for index in range(5):
+            self.add_show(self.venue, self.artist, time)
+        db.session.commit()
+
+        shows, after = getUpcomingShows(decodeCursor(encodeCursor(time, 0)), per_page=3)
+        rest, _ = getUpcomingShows(decodeCursor(after), per_page=3)
+        self.assertEqual(len(shows) + len(rest), 5)
+        self.assertLess(shows[-1].id, rest[0].id)
+
+    def test_shows_query_count(self):
+        self.assertLessEqual(self.count_queries('/shows'), 1)
+
+    def test_shows_json(self):
+        res = self.client().get('/shows?format=json')
+        data = res.get_json()
+
+        self.assertEqual(len(data['shows']), 24)
+        self.assertIsNotNone(data['next'])
+        self.assertIn('venue_name', data['shows'][0])
+        # datetimes are written as ISO 8601 by the json provider
+        self.assertEqual(datetime.fromisoformat(data['shows'][0]['start_time']).isoformat(),
+                         data['shows'][0]['start_time'])
+
+        res = self.client().get('/shows', query_string={'format': 'json', 'after': data['next']})
+        data = res.get_json()
+        self.assertEqual(len(data['shows']), 16)
+        self.assertIsNone(data['next'])
+
+    def test_shows_bad_cursor(self):
+        res = self.client().get('/shows?after=yesterday')
+        self.assertEqual(res.status_code, 400)
+
+    # connection pool
+    def test_pool_metrics(self):
+        metrics = getattr(db.engine.pool, 'metrics', None)
+        if metrics is None:
+            self.skipTest('in memory database is not pooled')
+        # give back the connection of the setUp session
+        db.session.remove()
+        checkouts = metrics.snapshot()['checkouts']
+
+        self.client().get('/venues')
+        snapshot = metrics.snapshot()
+        self.assertGreater(snapshot['checkouts'], checkouts)
+        self.assertEqual(snapshot['in_use'], 0)
+
+    # metrics
+    def test_metrics(self):
+        app.config['SERVER_TIMING'] = True
+        self.addCleanup(app.config.update, SERVER_TIMING=False)
+
+        res = self.client().get('/venues/{}'.format(self.venue_id))
+        self.assertIn('desc="2 queries"', res.headers['Server-Timing'])
+
+        metrics = self.client().get('/metrics').data.decode('utf-8')
+        self.assertIn('http_requests_total{endpoint="show_venue",method="GET",status="200"}', metrics)
+
+    def test_metrics_after_failed_statement(self):
+        with app.test_request_context('/'):
+            app.preprocess_request()
+            with db.engine.connect() as connection:
+                for attempt in range(3):
+                    with self.assertRaises(Exception):
+                        connection.execute(text('SELECT * FROM no_such_table'))
+                connection.execute(text('SELECT 1'))
+
+                # nothing of the failed statements is left on the connection
+                self.assertEqual(connection.info.get('query_start_time', []), [])
+            self.assertEqual(g.request_timing['db_queries'], 1)
+
+    # delete
+    def test_delete_venue_with_shows(self):
+        with QueryCounter(db.engine) as counter:
+            res = self.client().post('/venues/{}/delete'.format(self.venue_id))
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(counter.count, 8)
+
+        self.assertIsNone(Venue.query.get(self.venue_id))
+        self.assertEqual(Show.query.filter(Show.venue_id == self.venue_id).count(), 0)
+        self.assertEqual(db.session.query(show_venue).filter(show_venue.c.venu_id == self.venue_id).count(), 0)
+        self.assertEqual(db.session.query(show_artist).count(), 30)
+
+    def test_delete_artist_with_shows(self):
+        with QueryCounter(db.engine) as counter:
+            res = self.client().post('/artists/{}/delete'.format(self.artist_id))
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(counter.count, 8)
+
+        self.assertIsNone(Artist.query.get(self.artist_id))
+        self.assertEqual(Show.query.count(), 30)
+        self.assertEqual(db.session.query(show_venue).count(), 30)
+
+    # with USE_DB_CASCADE the shows and their links are deleted by the foreign keys
+    def test_delete_with_db_cascade(self):
+        app.config['USE_DB_CASCADE'] = True
+        self.addCleanup(app.config.update, USE_DB_CASCADE=False)
+
+        res = self.client().post('/venues/{}/delete'.format(self.venue_id))
+        self.assertEqual(res.status_code, 200)
+        res = self.client().post('/artists/{}/delete'.format(self.artist_id))
+        self.assertEqual(res.status_code, 200)
+
+        self.assertIsNone(Venue.query.get(self.venue_id))
+        self.assertIsNone(Artist.query.get(self.artist_id))
+        # every show was with the venue or the artist
+        self.assertEqual(Show.query.count(), 0)
+        self.assertEqual(db.session.query(show_venue).count(), 0)
+        self.assertEqual(db.session.query(show_artist).count(), 0)
+
+    # read replicas
+    # a copy of the database as the replica of the router
+    def use_replica(self):
+        database = make_url(app.config['SQLALCHEMY_DATABASE_URI']).database
+        if not database or not os.path.exists(database):
+            self.skipTest('needs a SQLite database file to copy as the replica')
+
+        db.session.remove()
+        replica = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'replica.db')
+        shutil.copy(database, make_url(replica).database)
+        router = app.extensions['replica_router']
+        router.configure([replica])
+        self.addCleanup(router.configure, [])
+        return router, replica
+
+    def test_replica_routing(self):
+        # the replica is a copy taken before the artist is deleted
+        router, _ = self.use_replica()
+
+        writer = self.client()
+        reader = self.client()
+        url = '/artists/{}'.format(self.artist_id)
+        headers = {'Authorization': 'Bearer writer'}
+        self.assertEqual(writer.post(url + '/delete', headers=headers).status_code, 200)
+
+        # the writer reads its own write from the primary, other clients the replica
+        self.assertEqual(writer.get(url).status_code, 302)
+        self.assertEqual(reader.get(url).status_code, 200)
+        # pinned by its Authorization header, without the cookie
+        self.assertEqual(self.client(use_cookies=False).get(url, headers=headers).status_code, 302)
+        # anonymous clients are only pinned by the cookie, not by their address
+        self.assertEqual(self.client(use_cookies=False).get(url).status_code, 200)
+
+        # once the pin expired, the writer reads from the replica again
+        self.addCleanup(setattr, router, 'pin_seconds', router.pin_seconds)
+        router.pin_seconds = 0
+        client = self.client()
+        client.post(url + '/delete')
+        self.assertEqual(client.get(url).status_code, 200)
+
+    def test_replica_read_only_post(self):
+        self.use_replica()
+        Artist.query.get(self.artist_id).name = 'Renamed Artist'
+        db.session.commit()
+
+        # the search is a POST which only reads: from the replica, without pinning
+        res = self.client().post('/artists/search', data={'search_term': 'Renamed'})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('Renamed Artist', res.data.decode('utf-8'))
+        self.assertNotIn('db_primary_until', res.headers.get('Set-Cookie', ''))
+
+    def test_replica_writes_during_get_go_to_primary(self):
+        _, replica = self.use_replica()
+
+        with app.test_request_context('/venues'):
+            app.preprocess_request()
+            self.assertIsNotNone(g.db_replica)
+            db.session.execute(text('UPDATE "Artist" SET name = :name WHERE id = :id'),
+                               {'name': 'Written Artist', 'id': self.artist_id})
+            db.session.commit()
+
+            self.assertTrue(g.db_wrote)
+            self.assertIsNone(g.db_replica)
+            self.assertEqual(Artist.query.get(self.artist_id).name, 'Written Artist')
+            # the client which wrote is pinned to the primary
+            response = app.process_response(app.response_class(''))
+            self.assertIn('db_primary_until', response.headers.get('Set-Cookie', ''))
+
+        replica_engine = create_engine(replica)
+        self.addCleanup(replica_engine.dispose)
+        name = replica_engine.execute(text('SELECT name FROM "Artist" WHERE id = :id'), id=self.artist_id).scalar()
+        self.assertEqual(name, 'Mock Artist')
+
+    def test_show_venue_splits_past_and_upcoming(self):
+        res = self.client().get('/venues/{}'.format(self.venue_id))
+        page = res.data.decode('utf-8')
+
+        self.assertIn('10 Past Shows', page)
+        self.assertIn('20 Upcoming Shows', page)
+        self.assertIn('Mock Artist 29', page)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
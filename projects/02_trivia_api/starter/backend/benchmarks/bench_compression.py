@@ -0,0 +1,94 @@
+'''
+Bytes on the wire and CPU time per request of the compressed listings.
+
+    python benchmarks/bench_compression.py
+    python benchmarks/bench_compression.py --requests 5000 --min-size 0
+
+Questions are seeded into a fresh SQLite file, then each listing is
+requested through the WSGI app with no Accept-Encoding, with gzip and,
+when the brotli package is installed, with br. Compressed bodies are
+measured twice: with the cache of the CompressionMiddleware disabled,
+so every request compresses, and with it enabled, so only the first one
+does. CPU time is the process time of the whole request, database
+included, and the best of `--rounds` rounds is reported.
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from werkzeug.test import EnvironBuilder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flaskr import create_app
+from fsnd_common.compression import supported_encodings
+from models import db
+from seed import seed
+
+PATHS = ('/api/questions?page=3', '/api/categories/2/questions?page=2', '/api/categories')
+
+def request_environ(path, encoding):
+  headers = {'Accept-Encoding': encoding} if encoding is not None else {}
+  return EnvironBuilder(path=path, headers=headers).get_environ()
+
+def timed(app, environ, requests):
+  def start_response(status, headers, exc_info=None):
+    start_response.headers = dict(headers)
+
+  size = 0
+  started = time.process_time()
+  for _ in range(requests):
+    body = app(dict(environ), start_response)
+    size = len(b''.join(body))
+    if hasattr(body, 'close'):
+      body.close()
+  elapsed = time.process_time() - started
+  return elapsed * 1000000 / requests, size, start_response.headers.get('Content-Encoding', 'identity')
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--questions', type=int, default=1000)
+  parser.add_argument('--requests', type=int, default=2000)
+  parser.add_argument('--rounds', type=int, default=5)
+  parser.add_argument('--min-size', type=int, default=None, help='COMPRESSION_MIN_SIZE, defaults to the app default')
+  args = parser.parse_args()
+
+  random.seed(0)
+  database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'trivia_compression.db')
+  config = {'DATABASE_PATH': database}
+  if args.min_size is not None:
+    config['COMPRESSION_MIN_SIZE'] = args.min_size
+
+  app = create_app(config)
+  with app.app_context():
+    db.create_all()
+    seed(args.questions, index=False)
+  compression = app.extensions['compression']
+
+  runs = [('identity', None, True)]
+  for encoding in reversed(supported_encodings()):
+    runs += [(encoding + ' no cache', encoding, False), (encoding + ' cached', encoding, True)]
+
+  best = {}
+  for _ in range(args.rounds):
+    for path in PATHS:
+      for name, encoding, cached in runs:
+        compression.cache_size = 256 if cached else 0
+        compression.clear()
+        microseconds, size, sent_encoding = timed(app, request_environ(path, encoding), args.requests // args.rounds)
+        key = (path, name)
+        best[key] = (min(microseconds, best.get(key, (microseconds,))[0]), size, sent_encoding)
+
+  print('{:<38} {:<24} {:>10} {:>8} {:>12}'.format('path', 'encoding', 'bytes', 'ratio', 'cpu us/req'))
+  for path in PATHS:
+    identity_size = best[(path, 'identity')][1]
+    for name, _, _ in runs:
+      microseconds, size, sent_encoding = best[(path, name)]
+      if sent_encoding == 'identity' and name != 'identity':
+        name += ' (not sent)'
+      print('{:<38} {:<24} {:>10} {:>8.2f} {:>12.1f}'.format(path, name, size, size / identity_size, microseconds))
+
+if __name__ == '__main__':
+  main()
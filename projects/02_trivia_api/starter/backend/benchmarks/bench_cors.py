@@ -0,0 +1,104 @@
+'''
+Per request overhead of the CORS handling.
+
+    python benchmarks/bench_cors.py
+    python benchmarks/bench_cors.py --requests 50000
+
+Compares, on a one route app, no CORS at all, the old flask_cors
+extension plus the after_request hook appending the three headers,
+and the CorsMiddleware. Requests are sent straight to the WSGI app so
+that only the application side is measured, and the best of `--rounds`
+rounds is reported.
+'''
+import argparse
+import os
+import sys
+import time
+from flask import Flask, jsonify
+from flask_cors import CORS
+from werkzeug.test import EnvironBuilder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fsnd_common.cors import CorsMiddleware
+
+def make_app():
+  app = Flask(__name__)
+
+  @app.route('/api/ping', methods=['GET', 'POST'])
+  def ping():
+    return jsonify({'success': True})
+
+  return app
+
+def no_cors_app():
+  return make_app()
+
+def flask_cors_app():
+  app = make_app()
+  CORS(app, resources={r"/api/*": {"origins": "*"}})
+
+  @app.after_request
+  def after_request(response):
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+    response.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS')
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+  return app
+
+def middleware_app():
+  app = make_app()
+  app.wsgi_app = CorsMiddleware(app.wsgi_app)
+  return app
+
+def request_environ(method, headers=None):
+  return EnvironBuilder(path='/api/ping', method=method, headers=headers or {}).get_environ()
+
+def timed(app, environ, requests):
+  def start_response(status, headers, exc_info=None):
+    start_response.headers = headers
+
+  started = time.perf_counter()
+  for _ in range(requests):
+    body = app(dict(environ), start_response)
+    b''.join(body)
+    if hasattr(body, 'close'):
+      body.close()
+  elapsed = time.perf_counter() - started
+
+  cors_headers = sum(1 for name, _ in start_response.headers if name.startswith('Access-Control-'))
+  return elapsed * 1000000 / requests, cors_headers
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--requests', type=int, default=20000)
+  parser.add_argument('--rounds', type=int, default=5)
+  args = parser.parse_args()
+
+  requests = {
+    'GET': request_environ('GET', {'Origin': 'http://localhost:3000'}),
+    'preflight': request_environ('OPTIONS', {
+      'Origin': 'http://localhost:3000',
+      'Access-Control-Request-Method': 'POST',
+      'Access-Control-Request-Headers': 'Content-Type'
+    })
+  }
+
+  apps = [('none', no_cors_app()), ('flask_cors', flask_cors_app()), ('middleware', middleware_app())]
+  best = {}
+  for _ in range(args.rounds):
+    for name, app in apps:
+      for request_name, environ in requests.items():
+        microseconds, cors_headers = timed(app, environ, args.requests // args.rounds)
+        key = (name, request_name)
+        best[key] = (min(microseconds, best.get(key, (microseconds,))[0]), cors_headers)
+
+  print('{:<12} {:<10} {:>12} {:>14}'.format('cors', 'request', 'us/request', 'cors headers'))
+  for name, _ in apps:
+    for request_name in requests:
+      microseconds, cors_headers = best[(name, request_name)]
+      print('{:<12} {:<10} {:>12.1f} {:>14}'.format(name, request_name, microseconds, cors_headers))
+
+if __name__ == '__main__':
+  main()
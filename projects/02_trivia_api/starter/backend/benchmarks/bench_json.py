@@ -0,0 +1,122 @@
+'''
+Encode time of the endpoint payloads with every json backend.
+
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --questions 100000 --rounds 10
+
+The trivia payloads are built like the endpoints build them, from
+questions seeded into a fresh SQLite file: a page of /api/questions,
+the questions of one category and a search page. The coffee shop
+/drinks-detail and the Fyyur /shows?format=json payloads, whose apps
+also use fsnd_common.fast_json, are built with the same shape.
+
+Every payload is encoded with flask's default provider and with each
+installed backend of fast_json (orjson, msgspec, json). The best of
+`--rounds` rounds is reported.
+'''
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fsnd_common import fast_json
+from flaskr import create_app
+from flaskr.pagination import get_questions_page
+from flaskr.reads import question_rows, format_questions
+from flaskr.search import search_questions
+from models import Question, db
+from seed import WORDS, seed
+
+COLORS = ['#f5deb3', '#6f4e37', '#ffffff', '#3c1f0f', '#c0c0c0']
+
+def trivia_payloads(categories):
+  page = format_questions(get_questions_page(1))
+  category = format_questions(question_rows().filter(Question.category == 1).all())
+  results, total = search_questions('title')
+  types = ['Category {}'.format(category_id) for category_id in range(1, categories + 1)]
+  return {
+    'trivia /api/questions': {
+      'questions': page, 'total_questions': len(page), 'categories': types,
+      'current_category': page[-1]['category'], 'page_index': 1
+    },
+    'trivia /api/categories/1/questions': {
+      'questions': category, 'total_questions': len(category), 'current_category': 1
+    },
+    'trivia /api/questions/search': {
+      'questions': format_questions(results), 'total_questions': total,
+      'current_category': 2, 'page_index': 1
+    }
+  }
+
+def coffee_payload(drinks):
+  return {'success': True, 'drinks': [{
+    'id': drink_id,
+    'title': 'Drink {}'.format(drink_id),
+    'recipe': [{'name': random.choice(WORDS), 'color': random.choice(COLORS), 'parts': random.randint(1, 3)}
+               for _ in range(random.randint(1, 4))]
+  } for drink_id in range(1, drinks + 1)]}
+
+def fyyur_payload(shows):
+  start = datetime.datetime(2024, 1, 1, 20, 0)
+  return {'next': None, 'shows': [{
+    'venue_id': random.randint(1, 100),
+    'venue_name': 'The Venue {}'.format(show_id % 100),
+    'artist_id': random.randint(1, 500),
+    'artist_name': 'Artist {}'.format(show_id % 500),
+    'artist_image_link': 'https://images.example.com/artists/{}.jpg'.format(show_id % 500),
+    'start_time': start + datetime.timedelta(hours=show_id)
+  } for show_id in range(shows)]}
+
+def timed(dumps, payload, rounds, repeat):
+  best = None
+  for _ in range(rounds):
+    started = time.perf_counter()
+    for _ in range(repeat):
+      dumps(payload)
+    elapsed = (time.perf_counter() - started) / repeat
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--questions', type=int, default=20000)
+  parser.add_argument('--categories', type=int, default=6)
+  parser.add_argument('--drinks', type=int, default=1000)
+  parser.add_argument('--shows', type=int, default=1000)
+  parser.add_argument('--rounds', type=int, default=5)
+  args = parser.parse_args()
+
+  random.seed(0)
+  database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'trivia_json.db')
+  app = create_app({'DATABASE_PATH': database})
+  with app.app_context():
+    seed(args.questions, args.categories)
+    payloads = trivia_payloads(args.categories)
+  payloads['coffee /drinks-detail'] = coffee_payload(args.drinks)
+  payloads['fyyur /shows?format=json'] = fyyur_payload(args.shows)
+
+  flask_default = DefaultJSONProvider(app)
+  encoders = [('flask', lambda payload: flask_default.dumps(payload, separators=fast_json.SEPARATORS))]
+  for backend in fast_json.available_backends():
+    encoders.append((backend, lambda payload, backend=backend: fast_json.dumps(payload, backend)))
+
+  print('{:<36} {:>9} {:<8} {:>12} {:>9}'.format('payload', 'kB', 'backend', 'us/encode', 'speedup'))
+  for name, payload in payloads.items():
+    size = len(fast_json.dumps(payload).encode('utf-8'))
+    # large payloads are encoded fewer times per round
+    repeat = max(1, 20000000 // max(size * 50, 1))
+    baseline = None
+    for backend, dumps in encoders:
+      seconds = timed(dumps, payload, args.rounds, repeat)
+      baseline = baseline or seconds
+      print('{:<36} {:>9.1f} {:<8} {:>12.1f} {:>8.2f}x'.format(
+        name, size / 1024, backend, seconds * 1000000, baseline / seconds))
+
+if __name__ == '__main__':
+  main()
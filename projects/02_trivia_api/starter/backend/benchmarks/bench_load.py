@@ -0,0 +1,234 @@
+'''
+Load test of the trivia API.
+
+    python benchmarks/bench_load.py                             # 10k questions, 8 clients, test client and server
+    python benchmarks/bench_load.py --questions 100000 --clients 32 --requests 2000
+    python benchmarks/bench_load.py --database postgresql://localhost:5432/trivia_bench
+    python benchmarks/bench_load.py --output after.json --compare before.json
+
+The questions and categories are seeded into a fresh SQLite file (or the
+given database, whose questions and categories are replaced). Then every
+scenario is run by `--clients` concurrent clients, through the Flask test
+client and through a real threaded WSGI server.
+
+The latency percentiles and the throughput of every scenario are printed
+as json, or written to `--output`. With `--compare`, every scenario whose
+p95 latency grew, or whose throughput dropped, by more than `--threshold`
+percent of the baseline is reported as a regression, and the script
+exits with status 1.
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flaskr import create_app
+from flaskr.pagination import QUESTIONS_PER_PAGE
+from models import db
+from seed import seed
+
+MODES = ['client', 'server']
+SEARCH_TERMS = ['title', 'whose autobiography', 'hematology', 'palace of', 'world cup', 'zzz']
+
+'''
+Scenarios
+    each one returns the (method, path, json body) of a random request
+'''
+def scenarios(questions, categories):
+  pages = max(1, questions // QUESTIONS_PER_PAGE)
+
+  return {
+    'questions_page': lambda: ('GET', '/api/questions?page={}'.format(random.randint(1, pages)), None),
+    'questions_after_id': lambda: ('GET', '/api/questions?after_id={}'.format(random.randint(0, questions - 1)), None),
+    'search': lambda: ('POST', '/api/questions/search', {'searchTerm': random.choice(SEARCH_TERMS)}),
+    'category_questions': lambda: ('GET', '/api/categories/{}/questions'.format(random.randint(1, categories)), None),
+    'quizzes': lambda: ('POST', '/api/quizzes', {
+      'previous_questions': random.sample(range(1, questions + 1), min(questions, 5)),
+      'quiz_category': random.randint(1, categories)
+    }),
+  }
+
+'''
+Senders
+    send one request and return its status code
+'''
+def test_client_sender(app):
+  local = threading.local()
+
+  def send(method, path, body):
+    if not hasattr(local, 'client'):
+      local.client = app.test_client()
+    return local.client.open(path, method=method, json=body).status_code
+  return send
+
+def server_sender(base_url):
+  def send(method, path, body):
+    data = None
+    headers = {}
+    if body is not None:
+      data = json.dumps(body).encode('utf-8')
+      headers['Content-Type'] = 'application/json'
+
+    request = urllib.request.Request(base_url + path, data=data, method=method, headers=headers)
+    try:
+      with urllib.request.urlopen(request) as response:
+        response.read()
+        return response.status
+    except urllib.error.HTTPError as error:
+      return error.code
+  return send
+
+def percentile(sorted_values, fraction):
+  if len(sorted_values) == 0:
+    return 0
+  index = max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1)
+  return sorted_values[min(index, len(sorted_values) - 1)]
+
+def run_scenario(send, make_request, requests, clients):
+  def one_request(_):
+    method, path, body = make_request()
+    started = time.perf_counter()
+    status = send(method, path, body)
+    return (time.perf_counter() - started) * 1000, status
+
+  # warm up the caches and the connection pool
+  for _ in range(min(clients, requests)):
+    one_request(None)
+
+  started = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=clients) as executor:
+    results = list(executor.map(one_request, range(requests)))
+  elapsed = time.perf_counter() - started
+
+  latencies = sorted(latency for latency, _ in results)
+  return {
+    'requests': requests,
+    'errors': sum(1 for _, status in results if status >= 500),
+    'statuses': dict((str(status), sum(1 for _, one in results if one == status))
+                     for status in sorted(set(status for _, status in results))),
+    'p50_ms': round(percentile(latencies, 0.50), 3),
+    'p95_ms': round(percentile(latencies, 0.95), 3),
+    'p99_ms': round(percentile(latencies, 0.99), 3),
+    'mean_ms': round(sum(latencies) / len(latencies), 3),
+    'throughput_rps': round(requests / elapsed, 1)
+  }
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+  def log_request(self, *args, **kwargs):
+    pass
+
+def run_mode(mode, app, all_scenarios, args):
+  server = None
+  if mode == 'server':
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    send = server_sender('http://127.0.0.1:{}'.format(server.server_port))
+  else:
+    send = test_client_sender(app)
+
+  try:
+    results = {}
+    for name, make_request in all_scenarios.items():
+      if args.scenario and name not in args.scenario:
+        continue
+      results[name] = run_scenario(send, make_request, args.requests, args.clients)
+      print('{:<7} {:<20} p50 {:>8.2f} ms  p95 {:>8.2f} ms  p99 {:>8.2f} ms  {:>8.1f} req/s'.format(
+        mode, name, results[name]['p50_ms'], results[name]['p95_ms'],
+        results[name]['p99_ms'], results[name]['throughput_rps']), file=sys.stderr)
+    return results
+  finally:
+    if server is not None:
+      server.shutdown()
+
+'''
+compare(results, baseline, threshold)
+    the scenarios whose p95 latency or throughput regressed by more
+    than `threshold` percent of the baseline
+'''
+def compare(results, baseline, threshold):
+  regressions = []
+  for mode, scenarios_results in results['results'].items():
+    for name, result in scenarios_results.items():
+      before = baseline.get('results', {}).get(mode, {}).get(name)
+      if before is None:
+        continue
+
+      p95_change = (result['p95_ms'] - before['p95_ms']) * 100 / max(before['p95_ms'], 0.001)
+      throughput_change = (result['throughput_rps'] - before['throughput_rps']) * 100 / max(before['throughput_rps'], 0.001)
+      print('{:<7} {:<20} p95 {:>+7.1f}%  throughput {:>+7.1f}%'.format(
+        mode, name, p95_change, throughput_change), file=sys.stderr)
+
+      if p95_change > threshold or throughput_change < -threshold:
+        regressions.append({
+          'mode': mode,
+          'scenario': name,
+          'p95_change_percent': round(p95_change, 1),
+          'throughput_change_percent': round(throughput_change, 1)
+        })
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--questions', type=int, default=10000)
+  parser.add_argument('--categories', type=int, default=6)
+  parser.add_argument('--database', help='database url, defaults to a temporary SQLite file')
+  parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+  parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+  parser.add_argument('--mode', choices=MODES, action='append', help='test client or WSGI server, defaults to both')
+  parser.add_argument('--scenario', action='append', help='run only these scenarios')
+  parser.add_argument('--seed', type=int, default=0, help='random seed of the data and the requests')
+  parser.add_argument('--output', help='write the json results to this file')
+  parser.add_argument('--compare', help='json results of a previous run')
+  parser.add_argument('--threshold', type=float, default=20, help='regression threshold, in percent')
+  args = parser.parse_args()
+
+  random.seed(args.seed)
+  database = args.database
+  if database is None:
+    database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'trivia_load.db')
+
+  app = create_app({'DATABASE_PATH': database})
+  with app.app_context():
+    seed(args.questions, args.categories)
+    db.session.remove()
+
+  all_scenarios = scenarios(args.questions, args.categories)
+  results = {
+    'meta': {
+      'database': database.split(':')[0],
+      'questions': args.questions,
+      'categories': args.categories,
+      'clients': args.clients,
+      'requests': args.requests
+    },
+    'results': dict((mode, run_mode(mode, app, all_scenarios, args)) for mode in (args.mode or MODES))
+  }
+
+  status = 0
+  if args.compare:
+    with open(args.compare) as baseline_file:
+      results['regressions'] = compare(results, json.load(baseline_file), args.threshold)
+    status = 1 if len(results['regressions']) > 0 else 0
+
+  output = json.dumps(results, indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      output_file.write(output + '\n')
+  else:
+    print(output)
+
+  sys.exit(status)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,89 @@
+'''
+Per row cost of the question listings, ORM instances against projected rows.
+
+    python benchmarks/bench_reads.py                   # 100k questions
+    python benchmarks/bench_reads.py --questions 1000000 --rounds 3
+    python benchmarks/bench_reads.py --database postgresql://localhost:5432/trivia_bench
+
+The questions are seeded into a fresh SQLite file (or the given database,
+whose questions are replaced). Every round loads all of them and builds
+the format() dicts, once from Question instances and once from the
+projected rows of flaskr.reads, in a new session each time. The best
+round and the peak memory allocated while loading are reported.
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flaskr import create_app
+from flaskr.reads import question_rows, format_questions
+from models import Question, db
+from seed import seed
+
+def orm_listing():
+  return [question.format() for question in Question.query.order_by(Question.id).all()]
+
+def projected_listing():
+  return format_questions(question_rows().order_by(Question.id).all())
+
+def timed(listing):
+  db.session.remove()
+  started = time.perf_counter()
+  questions = listing()
+  elapsed = time.perf_counter() - started
+  db.session.remove()
+  return elapsed, questions
+
+def peak_memory(listing):
+  db.session.remove()
+  tracemalloc.start()
+  try:
+    listing()
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+    db.session.remove()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--questions', type=int, default=100000)
+  parser.add_argument('--rounds', type=int, default=5)
+  parser.add_argument('--database', help='database url, defaults to a temporary SQLite file')
+  args = parser.parse_args()
+
+  random.seed(0)
+  database = args.database
+  if database is None:
+    database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'trivia_reads.db')
+
+  app = create_app({'DATABASE_PATH': database})
+  with app.app_context():
+    seed(args.questions, index=False)
+
+    listings = [('orm', orm_listing), ('projection', projected_listing)]
+    _, expected = timed(orm_listing)
+    _, projected = timed(projected_listing)
+    if projected != expected:
+      sys.exit('the projected rows do not match Question.format()')
+
+    best = {}
+    for _ in range(args.rounds):
+      for name, listing in listings:
+        elapsed, _ = timed(listing)
+        best[name] = min(elapsed, best.get(name, elapsed))
+
+    print('{:<12} {:>10} {:>12} {:>12}'.format('read', 'total ms', 'us/row', 'peak MB'))
+    for name, listing in listings:
+      print('{:<12} {:>10.1f} {:>12.2f} {:>12.1f}'.format(
+        name, best[name] * 1000, best[name] * 1000000 / args.questions,
+        peak_memory(listing) / 1024 / 1024))
+    print('{:<12} {:>10.2f}x'.format('speedup', best['orm'] / best['projection']))
+
+if __name__ == '__main__':
+  main()
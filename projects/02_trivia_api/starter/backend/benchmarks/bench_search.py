@@ -0,0 +1,69 @@
+'''
+Compares the ILIKE question search with the search index.
+
+    python benchmarks/bench_search.py                  # 10k, 100k and 1M questions
+    python benchmarks/bench_search.py 10000 100000     # custom sizes
+    python benchmarks/bench_search.py --database postgresql://localhost:5432/trivia_bench 10000
+
+Each size is seeded into a fresh SQLite file (or the given database,
+whose questions are replaced), then every search term is run `--repeat`
+times with both implementations.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flaskr import create_app
+from flaskr.search import search_questions
+from models import Question, db
+from seed import seed
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+SEARCH_TERMS = ['title', 'whose autobiography', 'hematology', 'matolog', 'palace of', 'zzz']
+
+def ilike_search(search_term):
+  keywords = "%" + search_term + "%"
+  return Question.query.filter(Question.question.ilike(keywords)).order_by(Question.question).all()
+
+def timed(function, repeat):
+  started = time.perf_counter()
+  for _ in range(repeat):
+    function()
+  return (time.perf_counter() - started) * 1000 / repeat
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES)
+  parser.add_argument('--database', help='database url, defaults to a temporary SQLite file')
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  print('{:>9} {:<22} {:>10} {:>10} {:>8} {:>8}'.format(
+    'questions', 'term', 'ilike ms', 'index ms', 'ilike', 'index'))
+
+  for size in args.sizes:
+    database = args.database
+    if database is None:
+      database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'trivia_bench.db')
+
+    app = create_app({'DATABASE_PATH': database})
+    with app.app_context():
+      seed(size)
+
+      for term in SEARCH_TERMS:
+        ilike_ms = timed(lambda: ilike_search(term), args.repeat)
+        index_ms = timed(lambda: search_questions(term), args.repeat)
+        ilike_count = len(ilike_search(term))
+        index_count = search_questions(term)[1]
+
+        print('{:>9} {:<22} {:>10.2f} {:>10.2f} {:>8} {:>8}'.format(
+          size, term, ilike_ms, index_ms, ilike_count, index_count))
+
+      db.session.remove()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,52 @@
+'''
+Questions seeded by the benchmarks.
+
+Imported by the bench_*.py scripts, after they put the backend
+directory on sys.path.
+'''
+import random
+
+from flaskr.search import rebuild_index
+from models import Category, Question, QuestionToken, db
+
+# questions inserted per statement
+SEED_BATCH_SIZE = 10000
+
+WORDS = ('what whose which where who title autobiography movie country city '
+         'largest river lake palace mirrors hall scarab beetle worshipped egypt '
+         'painting artist invented discovered hematology branch medicine blood '
+         'organ human body team world cup won year first element table boxer '
+         'heavyweight champion player scored goals mona lisa maya angelou').split()
+
+'''
+seed(questions, categories, index)
+    replaces the questions and categories with `categories` categories
+    and `questions` questions of 8 random WORDS, ids starting at 1.
+    the search index is rebuilt when `index` is set
+'''
+def seed(questions, categories=6, index=True):
+  db.session.execute(QuestionToken.__table__.delete())
+  db.session.execute(Question.__table__.delete())
+  db.session.execute(Category.__table__.delete())
+  db.session.execute(Category.__table__.insert(),
+                     [{'id': category_id, 'type': 'Category {}'.format(category_id)}
+                      for category_id in range(1, categories + 1)])
+
+  batch = []
+  for question_id in range(1, questions + 1):
+    batch.append({
+      'id': question_id,
+      'question': ' '.join(random.sample(WORDS, 8)).capitalize() + '?',
+      'answer': random.choice(WORDS),
+      'category': random.randint(1, categories),
+      'difficulty': random.randint(1, 5)
+    })
+    if len(batch) == SEED_BATCH_SIZE:
+      db.session.execute(Question.__table__.insert(), batch)
+      batch = []
+  if len(batch) > 0:
+    db.session.execute(Question.__table__.insert(), batch)
+  db.session.commit()
+
+  if index:
+    rebuild_index()
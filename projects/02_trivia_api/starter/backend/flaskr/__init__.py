@@ -1,33 +1,62 @@
 import os
-from flask import Flask, render_template, request, abort, jsonify
+from flask import Flask, Response, render_template, request, abort, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
-import random
+from flask_migrate import Migrate
+from sqlalchemy.exc import IntegrityError
 import sys
-
-from models import setup_db, Question, Category, db
-
-QUESTIONS_PER_PAGE = 10
+import click
+
+from models import setup_db, database_path, Question, Category, db
+from fsnd_common.instrumentation import Instrumentation
+from fsnd_common.routing import replica_reads
+from fsnd_common.fast_json import use_fast_json
+from .pagination import QUESTIONS_PER_PAGE, QuestionCounter, get_questions_page
+from .quiz import QuizSampler
+from .categories import CategoryCache
+from .search import search_questions, rebuild_index
+from fsnd_common.cors import MAX_AGE as CORS_MAX_AGE, CorsMiddleware
+from fsnd_common.compression import MIN_SIZE as COMPRESSION_MIN_SIZE, CACHE_SIZE as COMPRESSION_CACHE_SIZE, CompressionMiddleware
+from .bulk import IMPORT_BATCH_SIZE, is_valid_question, import_questions, export_questions
+from .reads import format_question, format_questions
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+  setup_db(app, app.config.get('DATABASE_PATH', database_path))
+  # schema changes of existing databases, see migrations/
+  Migrate(app, db)
+  # jsonify through orjson or msgspec when installed
+  use_fast_json(app)
+  # request latency and sql metrics at /metrics
+  Instrumentation(app)
+
+  # total number of questions, cached between requests
+  question_counter = QuestionCounter(app.config.get('QUESTION_COUNT_TTL', 60))
+  # question ids by category, used to pick quiz questions
+  quiz_sampler = QuizSampler(app.config.get('QUIZ_IDS_TTL', 300))
+  # category types and the serialized /api/categories payload
+  category_cache = CategoryCache(app.config.get('CATEGORY_CACHE_TTL', 300))
   
   '''
   @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
   '''
-  CORS(app, resources={r"/api/*": {"origins": "*"}})
-
-  '''
-  @TODO: Use the after_request decorator to set Access-Control-Allow
-  '''
-  @app.after_request 
-  def after_request(response):
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS')
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    return response
+  # gzip or brotli bodies of the large responses, compressed once per body
+  compression = CompressionMiddleware(app.wsgi_app,
+                                      min_size=app.config.get('COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE),
+                                      cache_size=app.config.get('COMPRESSION_CACHE_SIZE', COMPRESSION_CACHE_SIZE))
+  app.extensions['compression'] = compression
+  app.wsgi_app = compression
+  # the CORS headers of /api/* are prebuilt and added by one WSGI middleware,
+  # which also answers preflight requests without going through flask
+  app.wsgi_app = CorsMiddleware(app.wsgi_app, max_age=app.config.get('CORS_MAX_AGE', CORS_MAX_AGE))
+
+  @app.cli.command('reindex-questions')
+  def reindex_questions():
+    '''Rebuild the search index of all questions.'''
+    indexed = rebuild_index()
+    print('Indexed {} questions'.format(indexed))
 
   @app.route('/')
   def index():
@@ -40,14 +69,8 @@ def create_app(test_config=None):
   '''
   @app.route('/api/categories', methods=['GET'])
   def get_all_categories():
-    formated_categories = []
-    categories = Category.query.all()
-    if categories is not None:
-      formated_categories = [oneCate.type for oneCate in categories]
-
-    return jsonify({
-      "categories": formated_categories
-    })
+    # the payload is serialized once and reused until categories change
+    return app.response_class(category_cache.payload(), mimetype='application/json')
   
   '''
   @TODO: 
@@ -66,25 +89,21 @@ def create_app(test_config=None):
 
     # prepare indexes
     page_index = request.args.get('page', 1, type=int)
-    start = (page_index - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+    after_id = request.args.get('after_id', None, type=int)
+    if page_index < 1:
+      abort(404)
 
-    # find all the questions
-    questions = Question.query.order_by(Question.id).all()
-    total_questions = len(questions)
+    # only the requested page is loaded from the database
+    questions = get_questions_page(page_index, after_id)
+    total_questions = question_counter.get()
 
-    # format questions
-    if questions is None or len(questions) < start:
+    if len(questions) == 0:
       abort(404)
-    # filter all questions for the current page index
-    else:
-      formated_questions = [question.format() for question in questions[start: end]]
+
+    formated_questions = format_questions(questions)
 
     # categories
-    formated_categories = []
-    categories = Category.query.all()
-    if categories is not None:
-      formated_categories = [oneCate.type for oneCate in categories]
+    formated_categories = category_cache.types()
 
     result = {
       "questions": formated_questions,
@@ -112,6 +131,8 @@ def create_app(test_config=None):
 
       db.session.delete(question)
       db.session.commit()
+      question_counter.invalidate()
+      quiz_sampler.invalidate()
     except():
       db.session.rollback()
       error = True
@@ -152,6 +173,12 @@ def create_app(test_config=None):
       
       db.session.add(question)
       db.session.commit()
+      question_counter.invalidate()
+      quiz_sampler.invalidate()
+    except IntegrityError:
+      # the category does not exist
+      db.session.rollback()
+      abort(422)
     except:
       db.session.rollback()   
       abort(500)
@@ -163,11 +190,47 @@ def create_app(test_config=None):
       "details": "Question: " + details['question'] + ""
     })
 
-  def is_valid_question(dict_question):
-    if 'question' in dict_question and 'answer' in dict_question and 'difficulty' in dict_question and 'category' in dict_question: 
-       return True
-    else:
-      return False
+  '''
+  Bulk import / export of questions as NDJSON, one question per line
+  '''
+  def questions_changed():
+    question_counter.invalidate()
+    quiz_sampler.invalidate()
+
+  @app.route('/api/questions/import', methods=['POST'])
+  def import_questions_bulk():
+    batch_size = request.args.get('batch_size', IMPORT_BATCH_SIZE, type=int)
+    if batch_size < 1:
+      abort(422)
+
+    result = import_questions(request.stream, batch_size)
+    questions_changed()
+
+    return jsonify(result)
+
+  @app.route('/api/questions/export', methods=['GET'])
+  def export_questions_bulk():
+    return Response(stream_with_context(export_questions()), mimetype='application/x-ndjson')
+
+  @app.cli.command('import-questions')
+  @click.argument('questions_file', type=click.File('rb'))
+  @click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True,
+                help='Questions committed per transaction.')
+  def import_questions_command(questions_file, batch_size):
+    '''Import questions from an NDJSON file, one question per line.'''
+    result = import_questions(questions_file, batch_size)
+    questions_changed()
+
+    for error in result['errors']:
+      click.echo('Line {}: {}'.format(error['line'], error['error']), err=True)
+    click.echo('Imported {} questions, {} failed'.format(result['imported'], result['failed']))
+
+  @app.cli.command('export-questions')
+  @click.argument('questions_file', type=click.File('w'), default='-')
+  def export_questions_command(questions_file):
+    '''Export all questions to an NDJSON file, or to stdout.'''
+    for line in export_questions():
+      questions_file.write(line)
 
   '''
   @TODO: 
@@ -180,6 +243,7 @@ def create_app(test_config=None):
   Try using the word "title" to start. 
   '''
   @app.route('/api/questions/search', methods=['POST'])
+  @replica_reads
   def search_question():
 
     # make sure we have valid search terms
@@ -192,19 +256,20 @@ def create_app(test_config=None):
     if searchTerms is None or len(searchTerms) == 0:
       abort(422)
     
-    # find the question by search terms
-    keywords = "%" + searchTerms + "%"
-    results = Question.query.filter(Question.question.ilike(keywords)).order_by(Question.question).all()
+    page_index = request.json.get('page', 1)
+    if not isinstance(page_index, int) or page_index < 1:
+      abort(422)
+
+    # find the question by search terms in the search index
+    results, total_questions = search_questions(searchTerms, page_index)
 
-    viewItems = []
-    if len(results) > 0:
-      for result in results:
-        viewItems.append(result.format())
+    viewItems = format_questions(results)
 
     return jsonify({
       'questions': viewItems,
-      'total_questions': len(viewItems),
+      'total_questions': total_questions,
       'current_category': 2,
+      'page_index': page_index
     })
   
 
@@ -220,17 +285,25 @@ def create_app(test_config=None):
   @app.route('/api/categories/<int:category_id>/questions', methods=['GET'])
   def get_questions_by_category(category_id):
 
-    db_questions = Question.query.filter(Question.category==category_id).all()
+    # prepare indexes
+    page_index = request.args.get('page', 1, type=int)
+    after_id = request.args.get('after_id', None, type=int)
+    if page_index < 1:
+      abort(404)
+
+    # one page of plain rows, no Question instances are built for a listing
+    db_questions = get_questions_page(page_index, after_id, category_id=category_id)
 
-    if db_questions is None or len(db_questions) == 0:
+    if len(db_questions) == 0:
       abort(404)
 
-    formated_questions = [oneQuestion.format() for oneQuestion in db_questions]
+    formated_questions = format_questions(db_questions)
 
     result = {
       "questions": formated_questions,
-      "total_questions": len(formated_questions),
-      "current_category": category_id
+      "total_questions": question_counter.get(category_id),
+      "current_category": category_id,
+      "page_index": page_index
     }
 
     return jsonify(result)
@@ -247,6 +320,7 @@ def create_app(test_config=None):
   and shown whether they were correct or not. 
   '''
   @app.route('/api/quizzes', methods=['POST'])
+  @replica_reads
   def play_quizzes():
     request_data = request.json
     key_previous = 'previous_questions'
@@ -260,38 +334,17 @@ def create_app(test_config=None):
     if key_category in request_data:
       category = request_data[key_category]
 
-    question = None
-    # category is provided
-    if category is not None:
-      query = Question.query.filter(Question.category==category)
-      # filter out previouse questions
-      if previous is not None and len(previous) > 0:
-        questions = query.filter(Question.id.notin_(previous)).all()
-        if questions is not None and len(questions) > 0:
-          question = random.choice(questions)
-      # randomly return a question when no prameters are provided
-      else: 
-        question = random.choice(query.all())
-    
-    # category is not provided
-    else: 
-      query = Question.query
-      # filter out previouse questions
-      if previous is not None and len(previous) > 0: 
-        questions = query.filter(Question.id.notin_(previous)).all()
-        if questions is not None and len(questions) > 0:
-          question = random.choice(questions)
-      # randomly return a question when no prameters are provided
-      else: 
-        question = random.choice(query.all())
+    # pick an unplayed question from the cached ids,
+    # only the picked question is loaded from the database
+    question = quiz_sampler.pick(category, previous)
     
-    format_question:dict = None
+    formated_question:dict = None
     if question is not None: 
-      format_question = question.format()
+      formated_question = format_question(question)
     
     return jsonify({
       "previousQuestions": previous, 
-      "question": format_question
+      "question": formated_question
     })
 
   '''
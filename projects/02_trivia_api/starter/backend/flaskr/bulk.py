@@ -0,0 +1,112 @@
+import json
+
+from models import Question, db
+from .reads import question_rows, format_question
+
+# questions written per transaction when importing
+IMPORT_BATCH_SIZE = 500
+# questions read per query when exporting
+EXPORT_BATCH_SIZE = 1000
+
+'''
+is_valid_question(dict_question)
+    a question needs the question and answer text, a category and a difficulty
+'''
+def is_valid_question(dict_question):
+  if not isinstance(dict_question, dict):
+    return False
+
+  if 'question' in dict_question and 'answer' in dict_question and 'difficulty' in dict_question and 'category' in dict_question:
+    return True
+  else:
+    return False
+
+def _question_from_line(line):
+  details = json.loads(line)
+  if not is_valid_question(details):
+    raise ValueError('question, answer, difficulty and category are required')
+
+  return {
+    'question': details['question'],
+    'answer': details['answer'],
+    'difficulty': int(details['difficulty']),
+    'category': int(details['category'])
+  }
+
+def _insert_batch(batch, errors):
+  try:
+    db.session.add_all([Question(**details) for _, details in batch])
+    db.session.commit()
+    return len(batch)
+  except Exception:
+    db.session.rollback()
+
+  # the batch failed, insert its questions one by one to find the bad rows
+  imported = 0
+  for line_number, details in batch:
+    try:
+      db.session.add(Question(**details))
+      db.session.commit()
+      imported += 1
+    except Exception as error:
+      db.session.rollback()
+      errors.append({'line': line_number, 'error': str(error).split('\n')[0]})
+  return imported
+
+'''
+import_questions(lines, batch_size)
+    inserts one question per line of json (NDJSON).
+    valid questions are committed `batch_size` at a time, invalid lines
+    are reported with their line number and skipped
+'''
+def import_questions(lines, batch_size=IMPORT_BATCH_SIZE):
+  imported = 0
+  errors = []
+  batch = []
+
+  for line_number, line in enumerate(lines, start=1):
+    try:
+      # invalid utf-8 is a bad row too (UnicodeDecodeError is a ValueError)
+      if isinstance(line, bytes):
+        line = line.decode('utf-8')
+      if len(line.strip()) == 0:
+        continue
+
+      batch.append((line_number, _question_from_line(line)))
+    except (ValueError, TypeError) as error:
+      errors.append({'line': line_number, 'error': str(error)})
+      continue
+
+    if len(batch) >= batch_size:
+      imported += _insert_batch(batch, errors)
+      batch = []
+
+  if len(batch) > 0:
+    imported += _insert_batch(batch, errors)
+
+  return {
+    'imported': imported,
+    'failed': len(errors),
+    'errors': errors
+  }
+
+'''
+export_questions(batch_size)
+    yields every question as a line of json, ordered by id.
+    questions are read `batch_size` at a time, so the table is never
+    loaded in memory at once
+'''
+def export_questions(batch_size=EXPORT_BATCH_SIZE):
+  last_id = 0
+  while True:
+    rows = question_rows().filter(Question.id > last_id) \
+                          .order_by(Question.id) \
+                          .limit(batch_size) \
+                          .all()
+    if len(rows) == 0:
+      return
+
+    for row in rows:
+      yield json.dumps(format_question(row)) + '\n'
+
+    last_id = rows[-1].id
@@ -0,0 +1,78 @@
+import json
+import time
+import weakref
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import Category, db
+from fsnd_common.routing import use_primary
+
+# every CategoryCache, invalidated when categories are written
+_caches = weakref.WeakSet()
+
+'''
+CategoryCache
+    keeps the category types and the serialized /api/categories
+    payload in memory. categories almost never change, so they are
+    only reloaded after `ttl` seconds or after a Category write is
+    committed
+'''
+class CategoryCache:
+
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self._cached = None
+    self._expires_at = 0
+    _caches.add(self)
+
+  def invalidate(self):
+    self._cached = None
+
+  def _get(self):
+    cached = self._cached
+    if cached is None or time.monotonic() >= self._expires_at:
+      # read from the primary, a lagging replica would be cached for `ttl`
+      with use_primary():
+        types = [oneType for oneType, in db.session.query(Category.type).order_by(Category.id)]
+      payload = json.dumps({"categories": types}).encode('utf-8')
+      cached = (types, payload)
+      self._cached = cached
+      self._expires_at = time.monotonic() + self.ttl
+    return cached
+
+  '''
+  types()
+      list of category types, ordered by category id
+  '''
+  def types(self):
+    return list(self._get()[0])
+
+  '''
+  payload()
+      the /api/categories response body as json encoded bytes
+  '''
+  def payload(self):
+    return self._get()[1]
+
+'''
+Invalidation hooks
+    a Category insert, update or delete marks the session, and the
+    caches are cleared once that session commits
+'''
+def _mark_changed(mapper, connection, target):
+  session = object_session(target)
+  if session is not None:
+    session.info['categories_changed'] = True
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+  event.listen(Category, _event_name, _mark_changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+  if session.info.pop('categories_changed', False):
+    for cache in list(_caches):
+      cache.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+  session.info.pop('categories_changed', None)
@@ -0,0 +1,69 @@
+import time
+from sqlalchemy import func
+
+from models import Question, db
+from fsnd_common.routing import use_primary
+from .reads import question_rows
+
+QUESTIONS_PER_PAGE = 10
+
+'''
+QuestionCounter
+    caches the number of questions, in total and by category, so that
+    paging does not run a COUNT(*) on every request.
+    the cached values expire after `ttl` seconds, or earlier when
+    invalidate() is called after a question is created or deleted
+'''
+class QuestionCounter:
+
+  def __init__(self, ttl=60):
+    self.ttl = ttl
+    self._counts = {}
+    self._expires_at = 0
+
+  '''
+  get(category_id)
+      the number of questions of a category, or of all of them when
+      `category_id` is None. call it for a category only once a page of
+      it was found, so that unknown categories are not cached
+  '''
+  def get(self, category_id=None):
+    now = time.monotonic()
+    if now >= self._expires_at:
+      self._counts = {}
+      self._expires_at = now + self.ttl
+
+    count = self._counts.get(category_id)
+    if count is None:
+      query = db.session.query(func.count(Question.id))
+      if category_id is not None:
+        query = query.filter(Question.category == category_id)
+      with use_primary():
+        count = query.scalar()
+      self._counts[category_id] = count
+    return count
+
+  def invalidate(self):
+    self._counts = {}
+
+'''
+get_questions_page(page_index, after_id, per_page, category_id)
+    loads one page of questions ordered by id, as projected rows, of
+    one category when `category_id` is provided (read through the
+    (category, id) index).
+    LIMIT/OFFSET is used for `page_index`; when `after_id` is provided
+    the page starts right after that id instead (keyset paging), which
+    stays cheap for deep pages
+'''
+def get_questions_page(page_index=1, after_id=None, per_page=QUESTIONS_PER_PAGE, category_id=None):
+  query = question_rows().order_by(Question.id)
+
+  if category_id is not None:
+    query = query.filter(Question.category == category_id)
+
+  if after_id is not None:
+    query = query.filter(Question.id > after_id)
+  else:
+    query = query.offset((page_index - 1) * per_page)
+
+  return query.limit(per_page).all()
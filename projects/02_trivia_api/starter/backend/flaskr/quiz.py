@@ -0,0 +1,93 @@
+import random
+import time
+
+from models import Question, db
+from fsnd_common.routing import use_primary
+from .reads import get_question_row
+
+# random draws tried before falling back to a scan of the remaining ids
+MAX_RANDOM_DRAWS = 16
+
+'''
+QuizSampler
+    keeps the question ids of every category in memory, so that a quiz
+    round only loads the one question it returns.
+    the ids are reloaded after `ttl` seconds, or on the next round
+    after invalidate() is called when questions are created or deleted
+'''
+class QuizSampler:
+
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    # (all_ids, ids_by_category, expires_at), replaced as a whole so a
+    # round never sees the ids of one load with the expiry of another
+    self._snapshot = None
+
+  def invalidate(self):
+    self._snapshot = None
+
+  def _load(self):
+    all_ids = []
+    ids_by_category = {}
+    with use_primary():
+      rows = db.session.query(Question.id, Question.category).order_by(Question.id).all()
+    for question_id, category in rows:
+      all_ids.append(question_id)
+      ids_by_category.setdefault(category, []).append(question_id)
+
+    snapshot = (all_ids, ids_by_category, time.monotonic() + self.ttl)
+    self._snapshot = snapshot
+    return snapshot
+
+  def ids_for(self, category=None):
+    snapshot = self._snapshot
+    if snapshot is None or time.monotonic() >= snapshot[2]:
+      snapshot = self._load()
+
+    all_ids, ids_by_category, _ = snapshot
+    if category is None:
+      return all_ids
+    return ids_by_category.get(category, [])
+
+  '''
+  pick_id(category, previous)
+      returns a random question id of the category which is not in
+      `previous`, or None when every question has been played.
+      ids are drawn at random and rejected when already seen, which
+      takes O(1) expected draws while most questions are unplayed
+  '''
+  def pick_id(self, category=None, previous=None):
+    ids = self.ids_for(category)
+    if len(ids) == 0:
+      return None
+
+    seen = set(previous or [])
+    for _ in range(MAX_RANDOM_DRAWS):
+      question_id = random.choice(ids)
+      if question_id not in seen:
+        return question_id
+
+    # most questions are played, pick among the remaining ones
+    remaining = [question_id for question_id in ids if question_id not in seen]
+    if len(remaining) == 0:
+      return None
+    return random.choice(remaining)
+
+  '''
+  pick(category, previous)
+      same as pick_id(), but returns the question as a projected row
+  '''
+  def pick(self, category=None, previous=None):
+    question_id = self.pick_id(category, previous)
+    if question_id is None:
+      return None
+
+    question = get_question_row(question_id)
+    if question is None:
+      # deleted by another process, reload the ids and try again
+      self.invalidate()
+      question_id = self.pick_id(category, previous)
+      if question_id is not None:
+        question = get_question_row(question_id)
+
+    return question
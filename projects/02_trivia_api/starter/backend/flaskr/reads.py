@@ -0,0 +1,41 @@
+from models import Question, Category, db
+
+# keys of Question.format() and Category.format(), in the same order
+QUESTION_FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+CATEGORY_FIELDS = ('id', 'type')
+
+QUESTION_COLUMNS = tuple(getattr(Question, field) for field in QUESTION_FIELDS)
+CATEGORY_COLUMNS = tuple(getattr(Category, field) for field in CATEGORY_FIELDS)
+
+'''
+Read only projections
+    list endpoints select the columns they serve as plain rows instead
+    of Question and Category instances, so no ORM object is built,
+    tracked by the session or expired on commit.
+    the rows are turned into the same dicts as format()
+'''
+def question_rows():
+  return db.session.query(*QUESTION_COLUMNS)
+
+def category_rows():
+  return db.session.query(*CATEGORY_COLUMNS)
+
+'''
+format_question(row)
+    the Question.format() dict of a projected row
+'''
+def format_question(row):
+  return dict(zip(QUESTION_FIELDS, row))
+
+def format_questions(rows):
+  return [dict(zip(QUESTION_FIELDS, row)) for row in rows]
+
+def format_categories(rows):
+  return [dict(zip(CATEGORY_FIELDS, row)) for row in rows]
+
+'''
+get_question_row(question_id)
+    the projected row of one question, or None
+'''
+def get_question_row(question_id):
+  return question_rows().filter(Question.id == question_id).first()
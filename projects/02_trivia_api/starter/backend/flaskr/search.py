@@ -0,0 +1,160 @@
+import re
+from sqlalchemy import event, inspect, func, case, and_, or_
+
+from models import Question, QuestionToken, db
+from .reads import question_rows
+
+SEARCH_RESULTS_PER_PAGE = 10
+# questions indexed per statement when the index is rebuilt
+REINDEX_BATCH_SIZE = 1000
+
+_token_pattern = re.compile(r'\w+', re.UNICODE)
+
+tokens_table = QuestionToken.__table__
+
+'''
+tokenize(text)
+    lower case words of a text, without duplicates
+'''
+def tokenize(text):
+  if text is None:
+    return []
+
+  tokens = []
+  for token in _token_pattern.findall(text.lower()):
+    if token not in tokens:
+      tokens.append(token)
+  return tokens
+
+'''
+suffixes(text)
+    every suffix of every word of a text, without duplicates.
+    a word contains a search word when one of its suffixes starts with it
+'''
+def suffixes(text):
+  words = set()
+  for token in tokenize(text):
+    for start in range(len(token)):
+      words.add(token[start:])
+  return sorted(words)
+
+def _token_rows(question_id, text):
+  words = set(tokenize(text))
+  return [{'token': token, 'question_id': question_id, 'whole_word': token in words}
+          for token in suffixes(text)]
+
+'''
+Index maintenance
+    tokens are written in the same flush as the question,
+    so the index is always in sync with the questions table
+'''
+@event.listens_for(Question, 'after_insert')
+def _index_question(mapper, connection, target):
+  rows = _token_rows(target.id, target.question)
+  if len(rows) > 0:
+    connection.execute(tokens_table.insert(), rows)
+
+@event.listens_for(Question, 'after_update')
+def _reindex_question(mapper, connection, target):
+  if not inspect(target).attrs.question.history.has_changes():
+    return
+
+  connection.execute(tokens_table.delete().where(tokens_table.c.question_id == target.id))
+  _index_question(mapper, connection, target)
+
+@event.listens_for(Question, 'before_delete')
+def _unindex_question(mapper, connection, target):
+  connection.execute(tokens_table.delete().where(tokens_table.c.question_id == target.id))
+
+'''
+rebuild_index()
+    re-creates the tokens of every question, for questions which
+    were added by raw sql
+'''
+def rebuild_index(batch_size=REINDEX_BATCH_SIZE):
+  db.session.execute(tokens_table.delete())
+
+  indexed = 0
+  last_id = 0
+  while True:
+    questions = db.session.query(Question.id, Question.question) \
+                          .filter(Question.id > last_id) \
+                          .order_by(Question.id) \
+                          .limit(batch_size) \
+                          .all()
+    if len(questions) == 0:
+      break
+
+    rows = []
+    for question_id, text in questions:
+      rows.extend(_token_rows(question_id, text))
+    if len(rows) > 0:
+      db.session.execute(tokens_table.insert(), rows)
+
+    indexed += len(questions)
+    last_id = questions[-1][0]
+
+  db.session.commit()
+  return indexed
+
+def _prefix_condition(token):
+  # token >= 'abc' AND token < 'abd' matches every token starting with 'abc'
+  upper_bound = token[:-1] + chr(ord(token[-1]) + 1)
+  return and_(QuestionToken.token >= token, QuestionToken.token < upper_bound)
+
+# score of a search word equal to a word of the question, starting one, or inside one
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+INFIX_SCORE = 1
+
+def _word_score(token):
+  inside = _prefix_condition(token)
+  return func.max(case([
+    (and_(QuestionToken.token == token, QuestionToken.whole_word), EXACT_SCORE),
+    (and_(inside, QuestionToken.whole_word), PREFIX_SCORE),
+    (inside, INFIX_SCORE),
+  ], else_=0))
+
+'''
+search_questions(search_term, page_index, per_page)
+    a question matches when every word of the search term is a
+    substring of one of its words (a prefix of one of their suffixes).
+    questions are ranked by the sum of the best match of each search
+    word: a whole word, then the start of a word, then inside a word,
+    then by id.
+    returns the questions of the page, as projected rows, and the
+    total number of matches
+'''
+def search_questions(search_term, page_index=1, per_page=SEARCH_RESULTS_PER_PAGE):
+  tokens = tokenize(search_term)
+  if len(tokens) == 0:
+    return [], 0
+
+  conditions = [_prefix_condition(token) for token in tokens]
+  # the number of distinct search words matched by the question
+  matched = [func.max(case([(condition, 1)], else_=0)) for condition in conditions]
+  words = matched[0]
+  for one_word in matched[1:]:
+    words = words + one_word
+
+  scores = [_word_score(token) for token in tokens]
+  score = scores[0]
+  for one_score in scores[1:]:
+    score = score + one_score
+
+  ranked = db.session.query(QuestionToken.question_id.label('question_id'),
+                            score.label('score')) \
+                     .filter(or_(*conditions)) \
+                     .group_by(QuestionToken.question_id) \
+                     .having(words == len(tokens)) \
+                     .subquery()
+
+  total = db.session.query(func.count()).select_from(ranked).scalar()
+
+  questions = question_rows().join(ranked, ranked.c.question_id == Question.id) \
+                             .order_by(ranked.c.score.desc(), Question.id) \
+                             .offset((page_index - 1) * per_page) \
+                             .limit(per_page) \
+                             .all()
+
+  return questions, total
@@ -0,0 +1,108 @@
+"""trivia schema
+
+Revision ID: a3d5c1e8f027
+Revises:
+Create Date: 2026-10-18 15:12:08.214530
+
+The tables as db.create_all() and trivia.psql made them. Tables which
+already exist are kept, so a restored or created database can be
+upgraded without being stamped first.
+
+When question_tokens is empty, the search index of the questions
+already in the database, e.g. restored from trivia.psql, is built too.
+The table may have been created empty by db.create_all() when the app
+was loaded to run the migration.
+
+On Postgres question_tokens.token is COLLATE "C", also when the table
+already exists, so the prefix range scans of the search compare bytes
+and not the locale order.
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5c1e8f027'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# questions indexed per statement
+BACKFILL_BATCH_SIZE = 1000
+# the prefix range scans of the search need a byte order
+TOKEN_TYPE = sa.String().with_variant(sa.String(collation='C'), 'postgresql')
+
+# the words of flaskr.search.tokenize() at this revision
+_token_pattern = re.compile(r'\w+', re.UNICODE)
+
+
+def suffixes(text):
+    words = set()
+    for token in _token_pattern.findall((text or '').lower()):
+        for start in range(len(token)):
+            words.add(token[start:])
+    return sorted(words)
+
+
+def backfill_question_tokens():
+    questions = sa.table('questions', sa.column('id', sa.Integer), sa.column('question', sa.String))
+    tokens = sa.table('question_tokens', sa.column('token', sa.String), sa.column('question_id', sa.Integer))
+    bind = op.get_bind()
+    if bind.execute(sa.select([tokens.c.question_id]).limit(1)).first() is not None:
+        return
+
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select([questions.c.id, questions.c.question])
+                            .where(questions.c.id > last_id)
+                            .order_by(questions.c.id)
+                            .limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if len(rows) == 0:
+            return
+
+        token_rows = [{'token': token, 'question_id': question_id}
+                      for question_id, text in rows for token in suffixes(text)]
+        if len(token_rows) > 0:
+            op.bulk_insert(tokens, token_rows)
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'categories' not in tables:
+        op.create_table('categories',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'questions' not in tables:
+        op.create_table('questions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('question', sa.String(), nullable=True),
+        sa.Column('answer', sa.String(), nullable=True),
+        sa.Column('category', sa.Integer(), nullable=True),
+        sa.Column('difficulty', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'question_tokens' not in tables:
+        op.create_table('question_tokens',
+        sa.Column('token', TOKEN_TYPE, nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('token', 'question_id')
+        )
+        op.create_index(op.f('ix_question_tokens_question_id'), 'question_tokens', ['question_id'], unique=False)
+    elif op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('question_tokens', 'token', type_=TOKEN_TYPE)
+    backfill_question_tokens()
+
+
+def downgrade():
+    op.drop_index(op.f('ix_question_tokens_question_id'), table_name='question_tokens')
+    op.drop_table('question_tokens')
+    op.drop_table('questions')
+    op.drop_table('categories')
@@ -0,0 +1,70 @@
+"""search tokens which are whole words
+
+Revision ID: b9d2f6a1c354
+Revises: f1b7e4c2d950
+Create Date: 2026-10-18 21:04:37.518290
+
+question_tokens.whole_word marks the tokens which are a whole word of
+their question, not only the end of one, so the search can rank exact
+and prefix matches above matches inside a word. The flags of the
+questions already indexed are set from their words.
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d2f6a1c354'
+down_revision = 'f1b7e4c2d950'
+branch_labels = None
+depends_on = None
+
+# questions flagged per statement
+BACKFILL_BATCH_SIZE = 1000
+
+# the words of flaskr.search.tokenize() at this revision
+_token_pattern = re.compile(r'\w+', re.UNICODE)
+
+
+def flag_whole_words():
+    questions = sa.table('questions', sa.column('id', sa.Integer), sa.column('question', sa.String))
+    tokens = sa.table('question_tokens', sa.column('token', sa.String),
+                      sa.column('question_id', sa.Integer), sa.column('whole_word', sa.Boolean))
+    flag = tokens.update() \
+        .where(sa.and_(tokens.c.question_id == sa.bindparam('word_question_id'),
+                       tokens.c.token == sa.bindparam('word'))) \
+        .values(whole_word=True)
+    bind = op.get_bind()
+
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select([questions.c.id, questions.c.question])
+                            .where(questions.c.id > last_id)
+                            .order_by(questions.c.id)
+                            .limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if len(rows) == 0:
+            return
+
+        words = [{'word_question_id': question_id, 'word': word}
+                 for question_id, text in rows
+                 for word in set(_token_pattern.findall((text or '').lower()))]
+        if len(words) > 0:
+            bind.execute(flag, words)
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('question_tokens')]
+    # db.create_all() may have made the table with the column already
+    if 'whole_word' not in columns:
+        op.add_column('question_tokens', sa.Column('whole_word', sa.Boolean(), nullable=False,
+                                                   server_default=sa.false()))
+    flag_whole_words()
+
+
+def downgrade():
+    with op.batch_alter_table('question_tokens') as batch_op:
+        batch_op.drop_column('whole_word')
@@ -0,0 +1,103 @@
+"""questions category index and foreign key
+
+Revision ID: f1b7e4c2d950
+Revises: a3d5c1e8f027
+Create Date: 2026-10-18 15:31:44.902117
+
+The questions of a category are read in id order, by category, quiz
+and paging queries, so (category, id) is indexed.
+
+On Postgres both changes can run against a live table: the index is
+built CONCURRENTLY, outside of the migration transaction, and the
+foreign key is added NOT VALID then validated in its own transaction,
+so existing rows are checked without blocking writes.
+
+Questions of a category which does not exist would fail the key, so
+the upgrade stops and reports how many there are. Fix them by hand, or
+give them a NULL category, as the ON DELETE SET NULL of the key would
+have done, with:
+
+    flask db upgrade -x null_orphan_categories=true
+
+"""
+import logging
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b7e4c2d950'
+down_revision = 'a3d5c1e8f027'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_questions_category_id'
+FOREIGN_KEY = 'questions_category_fkey'
+# questions of a category which does not exist
+ORPHANS = 'category IS NOT NULL AND category NOT IN (SELECT id FROM categories)'
+
+logger = logging.getLogger('alembic.env')
+
+
+def category_foreign_keys(inspector):
+    return [fk for fk in inspector.get_foreign_keys('questions')
+            if fk['referred_table'] == 'categories' and fk['constrained_columns'] == ['category']]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    postgres = bind.dialect.name == 'postgresql'
+
+    if INDEX not in [index['name'] for index in inspector.get_indexes('questions')]:
+        if postgres:
+            with op.get_context().autocommit_block():
+                op.create_index(INDEX, 'questions', ['category', 'id'], unique=False,
+                                postgresql_concurrently=True)
+        else:
+            op.create_index(INDEX, 'questions', ['category', 'id'], unique=False)
+
+    # databases restored from trivia.psql already have this key, named category
+    if len(category_foreign_keys(inspector)) > 0:
+        return
+
+    orphans = bind.execute(sa.text('SELECT count(*) FROM questions WHERE ' + ORPHANS)).scalar()
+    if orphans > 0:
+        if context.get_x_argument(as_dictionary=True).get('null_orphan_categories') != 'true':
+            message = ('{} questions have a category which does not exist. Fix them, or run '
+                       'flask db upgrade -x null_orphan_categories=true to set their category '
+                       'to NULL'.format(orphans))
+            # flask db logs the error through a logger alembic.ini disables
+            logger.error(message)
+            raise RuntimeError(message)
+        logger.warning('Setting the category of %d questions to NULL, their category does not exist', orphans)
+        op.execute('UPDATE questions SET category = NULL WHERE ' + ORPHANS)
+    if postgres:
+        op.execute('ALTER TABLE questions ADD CONSTRAINT {} FOREIGN KEY (category) '
+                   'REFERENCES categories (id) ON UPDATE CASCADE ON DELETE SET NULL NOT VALID'.format(FOREIGN_KEY))
+        with op.get_context().autocommit_block():
+            op.execute('ALTER TABLE questions VALIDATE CONSTRAINT {}'.format(FOREIGN_KEY))
+    else:
+        with op.batch_alter_table('questions') as batch_op:
+            batch_op.create_foreign_key(FOREIGN_KEY, 'categories', ['category'], ['id'],
+                                        onupdate='CASCADE', ondelete='SET NULL')
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    postgres = bind.dialect.name == 'postgresql'
+
+    if FOREIGN_KEY in [fk['name'] for fk in category_foreign_keys(inspector)]:
+        if postgres:
+            op.drop_constraint(FOREIGN_KEY, 'questions', type_='foreignkey')
+        else:
+            with op.batch_alter_table('questions') as batch_op:
+                batch_op.drop_constraint(FOREIGN_KEY, type_='foreignkey')
+
+    if postgres:
+        with op.get_context().autocommit_block():
+            op.drop_index(INDEX, table_name='questions', postgresql_concurrently=True)
+    else:
+        op.drop_index(INDEX, table_name='questions')
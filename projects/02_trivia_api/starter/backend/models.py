@@ -1,35 +1,47 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, create_engine, false
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from fsnd_common.pool import engine_options
+from fsnd_common.routing import ReplicaRouter, RoutingSQLAlchemy
+
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('XinghouLiu@localhost:5432', database_name)
+database_path = os.environ.get('DATABASE_URL', "postgres://{}/{}".format('XinghouLiu@localhost:5432', database_name))
 
-db = SQLAlchemy()
+# reads of GET requests go to the replicas, when there are some
+db = RoutingSQLAlchemy()
 
 '''
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service.
+    the pool settings (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING) come from the app config or the environment.
+    the read replicas are DATABASE_REPLICA_URLS, see fsnd_common.routing.ReplicaRouter
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path, app.config, 'trivia')
     db.app = app
     db.init_app(app)
     db.create_all()
+    ReplicaRouter(app, 'trivia')
 
 '''
 Question
-
+    (category, id) is indexed for the questions of a category, which
+    are read in id order. see migrations/ for existing databases
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  __table_args__ = (db.Index('ix_questions_category_id', 'category', 'id'),)
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(Integer)
+  category = Column(Integer, ForeignKey('categories.id', name='questions_category_fkey',
+                                        onupdate='CASCADE', ondelete='SET NULL'))
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -75,4 +87,22 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+QuestionToken
+    inverted index of the suffixes of the words of each question, used
+    by search. the primary key (token, question_id) is ordered by token,
+    so prefix lookups are index range scans, and a prefix of a suffix
+    finds the words containing a search word. the tokens are compared
+    byte by byte (COLLATE "C" on postgres, the default of SQLite): with
+    a locale collation 'jazz' would not sort below the bound 'ja{'.
+    whole_word marks the suffixes which are a whole word of the question,
+    so the search ranks exact and prefix matches above infix matches
+'''
+class QuestionToken(db.Model):
+  __tablename__ = 'question_tokens'
+
+  token = Column(String().with_variant(String(collation='C'), 'postgresql'), primary_key=True)
+  question_id = Column(Integer, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True, index=True)
+  whole_word = Column(Boolean, nullable=False, default=False, server_default=false())
@@ -1,10 +1,15 @@
 import os
+import gzip
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.categories import CategoryCache
+from flaskr.quiz import QuizSampler
+from models import setup_db, db, Question, QuestionToken, Category
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -79,6 +84,45 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 405)
 
 
+
+    # the category cache is cleared by committed category writes only
+    def test_category_cache_cleared_on_write(self):
+        cache = CategoryCache(ttl=3600)
+        types, payload = cache.types(), cache.payload()
+
+        category = Category('Mock Category')
+        db.session.add(category)
+        db.session.commit()
+        self.assertEqual(cache.types(), types + ['Mock Category'])
+        self.assertIn(b'"Mock Category"', cache.payload())
+
+        category.type = 'Mock Category Renamed'
+        db.session.commit()
+        self.assertEqual(cache.types(), types + ['Mock Category Renamed'])
+        self.assertIn(b'"Mock Category Renamed"', cache.payload())
+
+        db.session.delete(category)
+        db.session.commit()
+        self.assertEqual(cache.types(), types)
+        self.assertEqual(cache.payload(), payload)
+
+    def test_category_cache_kept_on_rollback(self):
+        cache = CategoryCache(ttl=3600)
+        types, payload = cache.types(), cache.payload()
+
+        # a write the cache is not told about shows whether it is reloaded
+        table = Category.__table__
+        db.engine.execute(table.insert().values(type='Mock Category Unseen'))
+        self.addCleanup(db.engine.execute, table.delete().where(table.c.type == 'Mock Category Unseen'))
+
+        db.session.add(Category('Mock Category'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+
+        self.assertEqual(cache.types(), types)
+        self.assertEqual(cache.payload(), payload)
+
     # test get questions by page
     def test_get_questions_by_page(self):
         res = self.client().get('/api/questions?page=2')
@@ -87,6 +131,18 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(len(data['questions'])>0)
 
+    # test keyset paging after a question id
+    def test_get_questions_after_id(self):
+        first_page = json.loads(self.client().get('/api/questions').data)
+        last_id = first_page['questions'][-1]['id']
+
+        res = self.client().get('/api/questions?after_id={}'.format(last_id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], first_page['total_questions'])
+        self.assertTrue(all(question['id'] > last_id for question in data['questions']))
+
     # test page error handler
     def test_get_questions_by_page_error_handlers(self):
         res = self.client().get('/api/questions?page=100')
@@ -138,6 +194,44 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 422)
 
+        # questions.category references categories
+        unknown_category = dict(self.mock_question, category=999)
+        res = self.client().post('/api/questions/create', json=unknown_category)
+
+        self.assertEqual(res.status_code, 422)
+
+    # test bulk import and export
+    def test_import_questions(self):
+        lines = [json.dumps(self.mock_question), json.dumps({"Error":"Message"})]
+        res = self.client().post('/api/questions/import', data='\n'.join(lines),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+
+        res_data = json.loads(res.data)
+        self.assertEqual(res_data['imported'], 1)
+        self.assertEqual(res_data['failed'], 1)
+        self.assertEqual(res_data['errors'][0]['line'], 2)
+        self.assertIsNotNone(self.get_mock_question_from_db())
+
+    def test_import_invalid_utf8(self):
+        lines = [b'{"question": "\xff"}', json.dumps(self.mock_question).encode('utf-8')]
+        res = self.client().post('/api/questions/import', data=b'\n'.join(lines),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+
+        res_data = json.loads(res.data)
+        self.assertEqual(res_data['imported'], 1)
+        self.assertEqual(res_data['failed'], 1)
+        self.assertEqual(res_data['errors'][0]['line'], 1)
+
+    def test_export_questions(self):
+        res = self.client().get('/api/questions/export')
+        self.assertEqual(res.status_code, 200)
+
+        lines = res.data.decode('utf-8').splitlines()
+        self.assertEqual(len(lines), Question.query.count())
+        self.assertTrue('question' in json.loads(lines[0]))
+
     # test search 
     def test_search_question(self):
         self.add_mock_question_if_needed()
@@ -151,6 +245,67 @@ class TriviaTestCase(unittest.TestCase):
         self.assertIsNotNone(res_questions)
         self.assertTrue(len(res_questions) > 0)
 
+    def test_search_question_by_prefix(self):
+        self.add_mock_question_if_needed()
+        searchTerm = {'searchTerm': 'mock quest'}
+
+        res = self.client().post('/api/questions/search', json=searchTerm)
+        self.assertEqual(res.status_code, 200)
+
+        res_data = json.loads(res.data)
+        self.assertEqual(res_data['questions'][0]['question'], self.mock_question['question'])
+        self.assertTrue(len(res_data['questions']) <= 10)
+        self.assertTrue(res_data['total_questions'] >= len(res_data['questions']))
+
+    def test_search_question_by_infix(self):
+        self.add_mock_question_if_needed()
+        res = self.client().post('/api/questions/search', json={'searchTerm': 'OCK uesti'})
+        self.assertEqual(res.status_code, 200)
+
+        res_data = json.loads(res.data)
+        self.assertIn(self.mock_question['question'], [question['question'] for question in res_data['questions']])
+
+    def test_search_question_needs_every_word(self):
+        self.add_mock_question_if_needed()
+        res = self.client().post('/api/questions/search', json={'searchTerm': 'mock xylophonic'})
+        self.assertEqual(res.status_code, 200)
+
+        res_data = json.loads(res.data)
+        self.assertEqual(res_data['total_questions'], 0)
+        self.assertEqual(res_data['questions'], [])
+
+    def test_search_question_ranks_whole_words_first(self):
+        # added in id order infix, prefix, exact
+        texts = ['Mock bezorked', 'Mock zorkish', 'Mock zork']
+        for text in texts:
+            self.client().post('/api/questions/create', json=dict(self.mock_question, question=text))
+
+        res = self.client().post('/api/questions/search', json={'searchTerm': 'zork'})
+        self.assertEqual(res.status_code, 200)
+        res_data = json.loads(res.data)
+        self.assertEqual([question['question'] for question in res_data['questions']], texts[::-1])
+
+        question_ids = [question.id for question in Question.query.filter(Question.question.in_(texts)).all()]
+        for question_id in question_ids:
+            self.client().delete('/api/questions/{}'.format(question_id))
+
+    def test_search_question_word_ending_in_z(self):
+        # the prefix scan of 'jaz' ends below 'ja{', which sorts after 'jazz' only byte by byte
+        jazz_question = dict(self.mock_question, question='Mock jazz quiz')
+        self.client().post('/api/questions/create', json=jazz_question)
+
+        res = self.client().post('/api/questions/search', json={'searchTerm': 'jaz quiz'})
+        self.assertEqual(res.status_code, 200)
+        res_data = json.loads(res.data)
+        self.assertIn(jazz_question['question'], [question['question'] for question in res_data['questions']])
+
+        for question in Question.query.filter(Question.question == jazz_question['question']).all():
+            self.client().delete('/api/questions/{}'.format(question.id))
+
+    def test_search_tokens_compare_bytes_on_postgres(self):
+        ddl = str(CreateTable(QuestionToken.__table__).compile(dialect=postgresql.dialect()))
+        self.assertIn('token VARCHAR COLLATE "C"', ddl)
+
     def test_search_question_error_handlers(self):
         url = '/api/questions/search'
         res = self.client().post(url, json={"searchTerm":""})
@@ -159,6 +314,9 @@ class TriviaTestCase(unittest.TestCase):
         res = self.client().post(url, json={"searchTerms":"Mock"})
         self.assertEqual(res.status_code, 422)
 
+        res = self.client().post(url, json={"searchTerm":"Mock", "page":0})
+        self.assertEqual(res.status_code, 422)
+
     # test questions by category
     def test_get_questions_by_category(self):
         res = self.client().get('/api/categories/2/questions')
@@ -169,6 +327,29 @@ class TriviaTestCase(unittest.TestCase):
         self.assertIsNotNone(res_questions)
         self.assertTrue(len(res_questions) > 0)
 
+    def test_get_questions_by_category_same_as_format(self):
+        res = self.client().get('/api/categories/2/questions')
+
+        with self.app.app_context():
+            expected = [question.format() for question in
+                            Question.query.filter(Question.category==2).order_by(Question.id).limit(10).all()]
+        self.assertEqual(json.loads(res.data)['questions'], expected)
+
+    def test_get_questions_by_category_after_id(self):
+        first_page = json.loads(self.client().get('/api/categories/2/questions').data)
+        first_id = first_page['questions'][0]['id']
+
+        res = self.client().get('/api/categories/2/questions?after_id={}'.format(first_id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], first_page['total_questions'])
+        self.assertEqual(data['questions'], first_page['questions'][1:])
+
+    def test_get_questions_by_category_page_error_handlers(self):
+        res = self.client().get('/api/categories/2/questions?page=100')
+        self.assertEqual(res.status_code, 404)
+
     def test_get_questions_by_category_error_handlers(self):
         res = self.client().get('/api/categories/222/questions')
         self.assertEqual(res.status_code, 404)
@@ -204,6 +385,94 @@ class TriviaTestCase(unittest.TestCase):
         question_id = res_data['question']['id']
         self.assertFalse(question_id in question_ids)
 
+    def test_play_quizzes_all_played(self):
+        category = 2
+        question_ids = [question.id for question in
+                            Question.query.filter(Question.category==category).all()]
+        res = self.play_quizzes({
+                'previous_questions': question_ids,
+                'quiz_category': category
+            })
+
+        self.assertEqual(res.status_code, 200)
+        res_data = json.loads(res.data)
+        self.assertIsNone(res_data['question'])
+
+    # a question written while the ids load only makes the next round reload them
+    def test_quiz_sampler_invalidated_while_loading(self):
+        sampler = QuizSampler(ttl=3600)
+        load = sampler._load
+
+        def load_then_invalidate():
+            snapshot = load()
+            sampler.invalidate()
+            return snapshot
+        sampler._load = load_then_invalidate
+
+        question_ids = [question_id for question_id, in db.session.query(Question.id).order_by(Question.id)]
+        self.assertEqual(sampler.ids_for(), question_ids)
+        self.assertIsNotNone(sampler.pick_id(2))
+
+    # metrics
+    def test_metrics(self):
+        self.client().get('/api/questions?page=1')
+        res = self.client().get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        metrics = res.data.decode('utf-8')
+        self.assertIn('http_request_duration_seconds_count{endpoint="get_questions_by_page",method="GET"} 1', metrics)
+        self.assertIn('db_queries_total{endpoint="get_questions_by_page",method="GET"}', metrics)
+        self.assertIn('db_pool_in_use{pool="trivia"}', metrics)
+
+    # cors
+    def test_cors_headers(self):
+        res = self.client().get('/api/categories')
+
+        self.assertEqual(res.headers.getlist('Access-Control-Allow-Origin'), ['*'])
+
+    def test_cors_preflight(self):
+        res = self.client().options('/api/questions/search', headers={
+            'Origin': 'http://localhost:3000',
+            'Access-Control-Request-Method': 'POST'
+        })
+
+        self.assertEqual(res.status_code, 204)
+        self.assertEqual(res.headers['Access-Control-Max-Age'], '86400')
+        self.assertIn('POST', res.headers['Access-Control-Allow-Methods'])
+
+    # compression
+    def test_gzip_response(self):
+        self.app.extensions['compression'].min_size = 0
+        plain = self.client().get('/api/questions')
+        res = self.client().get('/api/questions', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(res.data)), json.loads(plain.data))
+
+    def test_compressed_body_is_cached(self):
+        compression = self.app.extensions['compression']
+        compression.min_size = 0
+        first = self.client().get('/api/categories', headers={'Accept-Encoding': 'gzip'})
+        second = self.client().get('/api/categories', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual((compression.misses, compression.hits), (1, 1))
+        self.assertEqual(first.data, second.data)
+
+    def test_small_response_not_compressed(self):
+        res = self.client().get('/api/categories', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+
+    def test_gzip_refused(self):
+        self.app.extensions['compression'].min_size = 0
+        res = self.client().get('/api/questions', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertTrue(len(json.loads(res.data)['questions']) > 0)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ class QuestionView extends Component {
       totalQuestions: 0,
       categories: {},
       currentCategory: null,
+      categoryId: null,
     }
   }
 
@@ -30,7 +31,8 @@ class QuestionView extends Component {
           questions: result.questions,
           totalQuestions: result.total_questions,
           categories: result.categories,
-          currentCategory: result.current_category })
+          currentCategory: result.current_category,
+          categoryId: null })
         return;
       },
       error: (error) => {
@@ -41,7 +43,11 @@ class QuestionView extends Component {
   }
 
   selectPage(num) {
-    this.setState({page: num}, () => this.getQuestions());
+    if (this.state.categoryId === null) {
+      this.setState({page: num}, () => this.getQuestions());
+    } else {
+      this.getByCategory(this.state.categoryId, num);
+    }
   }
 
   createPagination(){
@@ -58,15 +64,17 @@ class QuestionView extends Component {
     return pageNumbers;
   }
 
-  getByCategory= (id) => {
+  getByCategory= (id, page = 1) => {
     $.ajax({
-      url: `http://127.0.0.1:5000/api/categories/${id}/questions`, //TODO: update request URL
+      url: `http://127.0.0.1:5000/api/categories/${id}/questions?page=${page}`, //TODO: update request URL
       type: "GET",
       success: (result) => {
         this.setState({
           questions: result.questions,
           totalQuestions: result.total_questions,
-          currentCategory: result.current_category })
+          currentCategory: result.current_category,
+          categoryId: id,
+          page: page })
         return;
       },
       error: (error) => {
@@ -2,14 +2,34 @@ import os
 from flask import Flask, render_template, request, jsonify, abort
 from sqlalchemy import exc
 import json
-from flask_cors import CORS
 
 from .database.models import db_drop_and_create_all, setup_db, Drink, db
 from .auth.auth import AuthError, requires_auth, Permission
+from .cache import DrinksResponseCache
+from fsnd_common.instrumentation import Instrumentation
+from fsnd_common.fast_json import use_fast_json
+from fsnd_common.cors import CorsMiddleware
+from fsnd_common.compression import MIN_SIZE as COMPRESSION_MIN_SIZE, CompressionMiddleware
+from .batch import MAX_BATCH_SIZE, apply_batch, is_operation
 
 app = Flask(__name__)
 setup_db(app)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# jsonify through orjson or msgspec when installed
+use_fast_json(app)
+# request latency and sql metrics at /metrics
+instrumentation = Instrumentation(app)
+# gzip or brotli bodies of the drinks listings, compressed once per body
+compression = CompressionMiddleware(
+    app.wsgi_app, min_size=int(os.environ.get('COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE)))
+app.wsgi_app = compression
+# CORS headers of the drinks routes, prebuilt once. preflight requests
+# are answered by the middleware and cached by the browser for a day
+app.wsgi_app = CorsMiddleware(app.wsgi_app, prefixes=('/drinks',))
+
+# encoded drinks listings, dropped whenever a drink is written.
+# set DRINKS_CACHE_SHARED_VERSION=1 when running several server processes
+drinks_cache = DrinksResponseCache(
+    shared_version=os.environ.get('DRINKS_CACHE_SHARED_VERSION') == '1')
 
 '''
 @TODO uncomment the following line to initialize the datbase
@@ -19,14 +39,6 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 # db_drop_and_create_all()
 
 
-@app.after_request
-def after_request(response):
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS')
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    return response
-
-
 @app.route('/')
 def index():
     return jsonify({
@@ -46,8 +58,22 @@ def index():
 '''
 
 
-@app.route('/drinks', methods=['GET'])
-def get_drinks():
+'''
+drinks_response(representation, build)
+    a json response with the cached body of a drinks listing,
+    or 304 Not Modified when the client already has it (If-None-Match)
+'''
+
+
+def drinks_response(representation, build):
+    body, etag = drinks_cache.get(representation, build)
+
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def build_drinks_short():
     drinks = Drink.query.all()
 
     drinks_result = []
@@ -56,10 +82,28 @@ def get_drinks():
         for drink in drinks:
             drinks_result.append(drink.short())
 
-    return jsonify({
+    return {
         "success": True,
         "drinks": drinks_result
-    })
+    }
+
+
+def build_drinks_long():
+    drinks = Drink.query.all()
+
+    drinks_result = []
+    for drink in drinks:
+        drinks_result.append(drink.long())
+
+    return {
+        "success": True,
+        "drinks": drinks_result
+    }
+
+
+@app.route('/drinks', methods=['GET'])
+def get_drinks():
+    return drinks_response('short', build_drinks_short)
 
 
 '''
@@ -76,16 +120,7 @@ def get_drinks():
 @app.route('/drinks-detail', methods=['GET'])
 @requires_auth(Permission.GET_DRINKT_DETAILS)
 def get_drinks_detail(jwt):
-    drinks = Drink.query.all()
-
-    drinks_result = []
-    for drink in drinks:
-        drinks_result.append(drink.long())
-
-    return jsonify({
-        "success": True,
-        "drinks": drinks_result
-    })
+    return drinks_response('long', build_drinks_long)
 
 
 '''
@@ -118,6 +153,7 @@ def create_drink(jwt):
     try:
         drink = Drink(title=details[key_title], recipe=str_recipe)
         drink.insert()
+        drinks_cache.invalidate()
     except():
         success = False
     finally:
@@ -168,6 +204,7 @@ def update_drink(jwt, drink_id):
             target_drink.recipe = json.dumps(new_drink[key_recipe])
 
         target_drink.update()
+        drinks_cache.invalidate()
     except():
         success = False
     finally:
@@ -203,6 +240,7 @@ def delete_drink(jwt, drink_id):
     success = True
     try:
         target_drink.delete()
+        drinks_cache.invalidate()
     except():
         success = False
     finally:
@@ -214,6 +252,48 @@ def delete_drink(jwt, drink_id):
     })
 
 
+'''
+POST /drinks/batch
+    applies a list of create, update and delete operations in one
+    transaction, e.g. to sync the menu from a point of sale:
+        {"operations": [
+            {"op": "create", "title": "Latte", "recipe": [...]},
+            {"op": "update", "id": 2, "title": "Flat white"},
+            {"op": "delete", "id": 3}
+        ], "atomic": true}
+    the token is verified once and each operation type needs its own
+    permission (post:drinks, patch:drinks, delete:drinks).
+    returns status code 200 and json {"success": True, "results": results}
+    with one {"index", "op", "status", "id", "drink" or "error"} result
+    per operation. when `atomic` (the default) and an operation fails,
+    nothing is written and the status code is 422
+'''
+
+
+@app.route('/drinks/batch', methods=['POST'])
+@requires_auth(None)
+def batch_drinks(jwt):
+    details = request.get_json(silent=True)
+    if not isinstance(details, dict) or not isinstance(details.get('operations'), list):
+        abort(422)
+
+    operations = details['operations']
+    if len(operations) == 0 or len(operations) > MAX_BATCH_SIZE:
+        abort(422)
+    # malformed operations, e.g. {"op": ["create"]}
+    if not all(is_operation(operation) for operation in operations):
+        abort(400)
+
+    applied, results = apply_batch(operations, jwt, atomic=details.get('atomic', True) is not False)
+    if applied:
+        drinks_cache.invalidate()
+
+    return jsonify({
+        "success": applied,
+        "results": results
+    }), 200 if applied else 422
+
+
 # Error Handling
 '''
 Example error handling for unprocessable entity
@@ -301,5 +381,5 @@ def handle_auth_error(error):
         "success": False,
         "error": error.status_code,
         "message": error.error['description']
-    })
+    }), error.status_code
 
@@ -1,4 +1,13 @@
+import os
+import re
 import json
+import time
+import base64
+import binascii
+import hashlib
+import threading
+from collections import OrderedDict
+from http.client import HTTPException
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
@@ -9,6 +18,28 @@ AUTH0_DOMAIN = 'coffee-x.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee-x'
 
+# can point to a local file (file:///...) or server when testing
+JWKS_URL = os.environ.get('JWKS_URL',
+                          f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+# seconds the signing keys are kept before they are fetched again
+JWKS_CACHE_TTL = 600
+# an unknown kid refreshes the keys at most once per interval
+JWKS_MIN_REFRESH_INTERVAL = 30
+# seconds a fetch of the keys may take
+JWKS_FETCH_TIMEOUT = 5
+# seconds before a failed fetch is retried, doubled on each failure
+# in a row up to JWKS_CACHE_TTL
+JWKS_RETRY_INTERVAL = 5
+# number of verified tokens kept until they expire
+VERIFIED_TOKEN_CACHE_SIZE = 1024
+# seconds a rejected token is answered from memory, and number kept
+FAILED_TOKEN_CACHE_TTL = 30
+FAILED_TOKEN_CACHE_SIZE = 1024
+# longest token accepted, Auth0 access tokens are well below 4kB
+MAX_TOKEN_LENGTH = 8192
+# one base64url segment of a compact jws
+TOKEN_SEGMENT = re.compile(r'^[A-Za-z0-9_-]+$')
+
 # AuthError Exception
 '''
 AuthError Exception
@@ -107,67 +138,338 @@ def check_permissions(permission, payload):
 '''
 
 
-def verify_decode_jwt(token):
-    # GET THE PUBLIC KEY FROM AUTH0
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-
-    # GET THE DATA IN THE HEADER
-    unverified_header = jwt.get_unverified_header(token)
+# Key and token caches
+'''
+JWKSCache
+    the Auth0 signing keys indexed by kid.
+    keys are fetched again after `ttl` seconds, or when a token is signed
+    with a kid that is not known yet (at most once per
+    `min_refresh_interval` seconds, so bad tokens can not flood Auth0).
+    a fetch runs outside the lock, so tokens with a known kid are not
+    held up by it. when it fails the cached keys are kept, the next
+    fetch waits `retry_interval` seconds (doubled on each failure in a
+    row), and a token whose key is not cached gets a 503 AuthError
+'''
 
-    # CHOOSE OUR KEY
-    rsa_key = {}
-    if 'kid' not in unverified_header:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization malformed.'
-        }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
+class JWKSCache:
+    def __init__(self, url=JWKS_URL, ttl=JWKS_CACHE_TTL,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                 timeout=JWKS_FETCH_TIMEOUT,
+                 retry_interval=JWKS_RETRY_INTERVAL):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._keys = {}
+        self._fetched_at = None
+        self._retry_at = None
+        self._failures = 0
+        self._lock = threading.Lock()
+        # one fetch at a time
+        self._fetch_lock = threading.Lock()
+
+    def fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as jsonurl:
+            jwks = json.loads(jsonurl.read())
+
+        keys = {}
+        for key in jwks['keys']:
+            keys[key['kid']] = {
                 'kty': key['kty'],
                 'kid': key['kid'],
                 'use': key['use'],
                 'n': key['n'],
                 'e': key['e']
             }
+        return keys
+
+    def refresh(self):
+        keys = self.fetch()
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self._retry_at = None
+            self._failures = 0
+
+    def _needs_refresh(self, kid):
+        now = time.monotonic()
+        if self._retry_at is not None and now < self._retry_at:
+            return False
+        if self._fetched_at is None or now - self._fetched_at >= self.ttl:
+            return True
+        return kid not in self._keys and \
+            now - self._fetched_at >= self.min_refresh_interval
+
+    def _failed(self):
+        with self._lock:
+            backoff = min(self.retry_interval * 2 ** self._failures, self.ttl)
+            self._retry_at = time.monotonic() + backoff
+            self._failures += 1
+
+    def get_key(self, kid):
+        with self._lock:
+            if not self._needs_refresh(kid):
+                return self._cached_key(kid)
+
+        with self._fetch_lock:
+            # another request may have fetched while this one waited
+            with self._lock:
+                refresh = self._needs_refresh(kid)
+            if refresh:
+                try:
+                    self.refresh()
+                except (OSError, HTTPException, ValueError,
+                        KeyError, TypeError):
+                    self._failed()
+
+        with self._lock:
+            return self._cached_key(kid)
+
+    def _cached_key(self, kid):
+        # called with the lock held
+        key = self._keys.get(kid)
+        if key is None and self._failures:
+            raise AuthError({
+                'code': 'jwks_unavailable',
+                'description': 'Unable to fetch the signing keys.'
+            }, 503)
+        return key
 
-    # Finally, verify!!!
-    if rsa_key:
-        try:
-            # USE THE KEY TO VALIDATE THE JWT
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._retry_at = None
+            self._failures = 0
+
+
+'''
+VerifiedTokenCache
+    a bounded LRU of decoded payloads of tokens which were verified,
+    a payload is dropped once the token `exp` is reached
+'''
+
+
+class VerifiedTokenCache:
+    def __init__(self, max_size=VERIFIED_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            cached = self._payloads.get(key)
+            if cached is None:
+                return None
 
+            expires_at, payload = cached
+            if time.time() >= expires_at:
+                del self._payloads[key]
+                return None
+
+            self._payloads.move_to_end(key)
             return payload
 
-        except jwt.ExpiredSignatureError:
-            raise AuthError({
-                'code': 'token_expired',
-                'description': 'Token expired.'
-            }, 401)
+    def put(self, token, payload):
+        # tokens without an expiry are never cached
+        if 'exp' not in payload:
+            return
+
+        key = self._key(token)
+        with self._lock:
+            self._payloads[key] = (payload['exp'], payload)
+            self._payloads.move_to_end(key)
+            while len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+
+'''
+FailedTokenCache
+    a bounded LRU of the error and status of tokens whose signature or
+    claims were rejected, kept `ttl` seconds so a client retrying a bad token is answered
+    without decoding it, or verifying its signature, again.
+    each hit returns a new AuthError, a raised exception carries the
+    traceback of the request that raised it
+'''
+
+
+class FailedTokenCache:
+    def __init__(self, ttl=FAILED_TOKEN_CACHE_TTL,
+                 max_size=FAILED_TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._errors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        key = VerifiedTokenCache._key(token)
+        with self._lock:
+            cached = self._errors.get(key)
+            if cached is None:
+                return None
+
+            expires_at, error, status_code = cached
+            if time.monotonic() >= expires_at:
+                del self._errors[key]
+                return None
+
+            self._errors.move_to_end(key)
+            return AuthError(dict(error), status_code)
+
+    def put(self, token, error):
+        key = VerifiedTokenCache._key(token)
+        with self._lock:
+            self._errors[key] = (time.monotonic() + self.ttl,
+                                 dict(error.error), error.status_code)
+            self._errors.move_to_end(key)
+            while len(self._errors) > self.max_size:
+                self._errors.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._errors.clear()
+
+
+jwks_cache = JWKSCache()
+verified_tokens = VerifiedTokenCache()
+failed_tokens = FailedTokenCache()
 
-        except jwt.JWTClaimsError:
+
+def _decode_segment(segment):
+    padded = segment + '=' * (-len(segment) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded))
+    if not isinstance(data, dict):
+        raise ValueError('not a json object')
+    return data
+
+
+'''
+precheck_token(token)
+    the checks which need neither the signing keys nor the signature:
+    three base64url segments, a json header with a supported alg and a
+    kid, a json payload with a numeric exp in the future.
+    returns (unverified_header, rsa_key), raises the same AuthError
+    the signature verification would
+'''
+
+
+def precheck_token(token):
+    malformed = AuthError({
+        'code': 'invalid_header',
+        'description': 'Unable to parse authentication token.'
+    }, 400)
+
+    segments = token.split('.')
+    if len(token) > MAX_TOKEN_LENGTH or len(segments) != 3 or \
+            not all(TOKEN_SEGMENT.match(segment) for segment in segments):
+        raise malformed
+
+    try:
+        unverified_header = _decode_segment(segments[0])
+        unverified_claims = _decode_segment(segments[1])
+    except (ValueError, binascii.Error):
+        raise malformed
+
+    if unverified_header.get('alg') not in ALGORITHMS:
+        raise malformed
+
+    # CHOOSE OUR KEY
+    if 'kid' not in unverified_header:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization malformed.'
+        }, 401)
+
+    # an expired token is rejected before its signature is checked
+    exp = unverified_claims.get('exp')
+    if exp is not None:
+        if isinstance(exp, bool) or not isinstance(exp, (int, float)):
             raise AuthError({
                 'code': 'invalid_claims',
                 'description': 'Incorrect claims. Please, check the audience and issuer.'
             }, 401)
-        except Exception:
+        if exp <= time.time():
             raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to parse authentication token.'
-            }, 400)
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+
+    # GET THE PUBLIC KEY FROM THE CACHED AUTH0 KEYS
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
+    if not rsa_key:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to find the appropriate key.'
+        }, 400)
+
+    return unverified_header, rsa_key
+
+
+def verify_decode_jwt(token):
+    # A TOKEN WHICH WAS ALREADY VERIFIED AND IS NOT EXPIRED
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
+
+    # A TOKEN WHICH WAS REJECTED A MOMENT AGO
+    error = failed_tokens.get(token)
+    if error is not None:
+        raise error
+
+    # rejected without the signature being checked, and not remembered:
+    # a kid unknown now may be published with the next keys
+    _, rsa_key = precheck_token(token)
+
+    try:
+        return _verify_decode_jwt(token, rsa_key)
+    except AuthError as error:
+        failed_tokens.put(token, error)
+        raise
+
+
+def _verify_decode_jwt(token, rsa_key):
+    # Finally, verify!!!
+    try:
+        # USE THE KEY TO VALIDATE THE JWT
+        payload = jwt.decode(
+            token,
+            rsa_key,
+            algorithms=ALGORITHMS,
+            audience=API_AUDIENCE,
+            issuer='https://' + AUTH0_DOMAIN + '/'
+        )
+
+        verified_tokens.put(token, payload)
+        return payload
+
+    except jwt.ExpiredSignatureError:
+        raise AuthError({
+            'code': 'token_expired',
+            'description': 'Token expired.'
+        }, 401)
+
+    except jwt.JWTClaimsError:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Incorrect claims. Please, check the audience and issuer.'
+        }, 401)
+    except Exception:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to parse authentication token.'
+        }, 400)
 
-    raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to find the appropriate key.'
-            }, 400)
 
 '''
 @TODO implement @requires_auth(permission) decorator method
@@ -187,12 +489,14 @@ def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            try:
-                token = get_token_auth_header()
-                payload = verify_decode_jwt(token)
+            # an AuthError reaches the AuthError handler with its
+            # own status: 400 malformed, 401 unauthenticated, 403 forbidden
+            token = get_token_auth_header()
+            payload = verify_decode_jwt(token)
+            # None only verifies the token, the permissions are
+            # checked by the decorated method
+            if permission is not None:
                 check_permissions(permission, payload)
-            except:
-                abort(401)
 
             return f(payload, *args, **kwargs)
 
@@ -0,0 +1,225 @@
+import json
+from sqlalchemy import exc
+
+from .database.models import Drink, db
+from .auth.auth import AuthError, Permission, check_permissions
+
+# most operations accepted in one batch
+MAX_BATCH_SIZE = 500
+
+PERMISSIONS = {
+    'create': Permission.POST_DRINKS,
+    'update': Permission.UPDATE_DRINKS,
+    'delete': Permission.DELETE_DRINKS
+}
+
+
+class BatchError(Exception):
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.message = message
+
+
+def _recipe_string(recipe):
+    if not isinstance(recipe, list) or len(recipe) == 0:
+        raise BatchError(422, 'recipe must be a non empty list of ingredients')
+    for ingredient in recipe:
+        if not isinstance(ingredient, dict) or 'color' not in ingredient or 'parts' not in ingredient:
+            raise BatchError(422, 'every ingredient needs a color and parts')
+
+    recipe_string = json.dumps(recipe)
+    if len(recipe_string) > Drink.recipe.type.length:
+        raise BatchError(422, 'recipe is too long')
+    return recipe_string
+
+
+def _title(operation, required):
+    title = operation.get('title')
+    if title is None and not required:
+        return None
+    if not isinstance(title, str) or len(title.strip()) == 0:
+        raise BatchError(422, 'title is required')
+    if len(title) > Drink.title.type.length:
+        raise BatchError(422, 'title is too long')
+    return title
+
+
+def _is_id(value):
+    # bool is an int, but true is not drink 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+'''
+is_operation(operation)
+    whether `operation` is an object with a string op, which can be
+    looked up in PERMISSIONS
+'''
+
+
+def is_operation(operation):
+    return isinstance(operation, dict) and isinstance(operation.get('op'), str)
+
+
+def _drink_id(operation):
+    drink_id = operation.get('id')
+    if not _is_id(drink_id):
+        raise BatchError(422, 'id is required')
+    return drink_id
+
+
+'''
+apply_batch(operations, payload, atomic)
+    applies a list of create, update and delete operations on drinks
+    in one transaction, and returns (applied, results) with one result
+    per operation, in order.
+
+    the permission of each operation type is checked once against the
+    jwt `payload`. every drink and title the batch refers to is loaded
+    with two queries, then the operations are checked in order against
+    that state, so duplicated titles are found without a query per item.
+
+    with `atomic`, nothing is written when any operation fails.
+    otherwise the valid operations are written and the others reported
+'''
+
+
+def apply_batch(operations, payload, atomic=True):
+    allowed = {}
+    for op in set(operation['op'] for operation in operations if is_operation(operation)):
+        if op in PERMISSIONS:
+            try:
+                allowed[op] = check_permissions(PERMISSIONS[op], payload)
+            except AuthError as error:
+                allowed[op] = error
+
+    # every drink and title referred to by the batch, in two queries
+    ids = set(operation.get('id') for operation in operations
+              if isinstance(operation, dict) and _is_id(operation.get('id')))
+    titles = set(operation.get('title') for operation in operations
+                 if isinstance(operation, dict) and isinstance(operation.get('title'), str))
+
+    drinks = {}
+    if len(ids) > 0:
+        drinks = dict((drink.id, drink) for drink in Drink.query.filter(Drink.id.in_(ids)))
+    title_owners = dict((drink.title, drink.id) for drink in drinks.values())
+    if len(titles) > 0:
+        title_owners.update(db.session.query(Drink.title, Drink.id).filter(Drink.title.in_(titles)))
+
+    deleted = set()
+    renamed_titles = set()
+    planned = []
+    results = []
+    for index, operation in enumerate(operations):
+        result = {'index': index}
+        try:
+            if not is_operation(operation):
+                raise BatchError(400, 'op must be a string')
+            if operation['op'] not in PERMISSIONS:
+                raise BatchError(422, 'op must be one of create, update or delete')
+            op = operation['op']
+            result['op'] = op
+            if isinstance(allowed[op], AuthError):
+                raise BatchError(allowed[op].status_code, allowed[op].error['description'])
+
+            if op == 'create':
+                title = _title(operation, required=True)
+                recipe = _recipe_string(operation.get('recipe'))
+                if title in title_owners:
+                    raise BatchError(409, 'title already exists')
+                title_owners[title] = None
+                planned.append((result, op, Drink(title=title, recipe=recipe)))
+
+            elif op == 'update':
+                drink_id = _drink_id(operation)
+                result['id'] = drink_id
+                if drink_id not in drinks or drink_id in deleted:
+                    raise BatchError(404, 'drink not found')
+                title = _title(operation, required=False)
+                recipe = None
+                if 'recipe' in operation:
+                    recipe = _recipe_string(operation['recipe'])
+                if title is None and recipe is None:
+                    raise BatchError(422, 'title or recipe is required')
+                if title is not None and title_owners.get(title, drink_id) != drink_id:
+                    raise BatchError(409, 'title already exists')
+
+                # a title given up by an earlier rename of the batch must be
+                # written after that rename
+                after_rename = title in renamed_titles
+                if title is not None and title != drinks[drink_id].title:
+                    title_owners.pop(drinks[drink_id].title, None)
+                    renamed_titles.add(drinks[drink_id].title)
+                    title_owners[title] = drink_id
+                planned.append((result, op, (drinks[drink_id], title, recipe, after_rename)))
+
+            else:
+                drink_id = _drink_id(operation)
+                result['id'] = drink_id
+                if drink_id not in drinks or drink_id in deleted:
+                    raise BatchError(404, 'drink not found')
+                deleted.add(drink_id)
+                title_owners.pop(drinks[drink_id].title, None)
+                planned.append((result, op, drinks[drink_id]))
+
+            result['status'] = 200
+        except BatchError as error:
+            result['status'] = error.status_code
+            result['error'] = error.message
+        results.append(result)
+
+    failed = any(result['status'] != 200 for result in results)
+    if len(planned) == 0 or (atomic and failed):
+        for result in results:
+            if result['status'] == 200:
+                result['status'] = 424
+                result['error'] = 'not applied, another operation failed'
+        db.session.rollback()
+        return False, results
+
+    # titles of deleted drinks can be reused by the batch,
+    # so the deletes are written first
+    if len(deleted) > 0:
+        for result, op, target in planned:
+            if op == 'delete':
+                db.session.delete(target)
+        db.session.flush()
+
+    for result, op, target in planned:
+        if op == 'update':
+            drink, title, recipe, after_rename = target
+            if drink.id in deleted:
+                # deleted later in the same batch
+                continue
+            if after_rename:
+                db.session.flush()
+            if title is not None:
+                drink.title = title
+            if recipe is not None:
+                drink.recipe = recipe
+        elif op == 'create':
+            db.session.add(target)
+
+    try:
+        # the results are read after the flush and before the commit,
+        # which expires the drinks and would reload them one by one
+        db.session.flush()
+        for result, op, target in planned:
+            if op == 'create':
+                result['id'] = target.id
+                result['drink'] = target.long()
+            elif op == 'update' and target[0].id not in deleted:
+                result['drink'] = target[0].long()
+        db.session.commit()
+    except exc.SQLAlchemyError:
+        # a title was taken by another request in the meantime
+        db.session.rollback()
+        for result in results:
+            result.pop('drink', None)
+            if result.get('op') == 'create':
+                result.pop('id', None)
+            if result['status'] == 200:
+                result['status'] = 409
+                result['error'] = 'not applied, the batch conflicts with a concurrent change'
+        return False, results
+
+    return True, results
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from flask import json
+from sqlalchemy import update
+
+from .database.models import MENU_VERSION_ID, MenuVersion, db
+from fsnd_common.routing import use_primary
+
+'''
+DrinksResponseCache
+    keeps the encoded json body and the etag of each drinks listing,
+    keyed by representation ('short' or 'long').
+    invalidate() must be called after the drinks are changed. with
+    `shared_version` enabled the change is also counted in the
+    menu_version table, so other server processes drop their cache too.
+    the table is part of the schema, see db_drop_and_create_all()
+'''
+
+
+class DrinksResponseCache:
+    def __init__(self, shared_version=False):
+        self.shared_version = shared_version
+        self._local_version = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _shared_version(self):
+        if not self.shared_version:
+            return None
+
+        # a lagging replica would hide the change of another process
+        with use_primary():
+            return db.session.query(MenuVersion.version) \
+                .filter(MenuVersion.id == MENU_VERSION_ID).scalar()
+
+    def version(self):
+        return (self._local_version, self._shared_version())
+
+    def invalidate(self):
+        with self._lock:
+            self._local_version += 1
+            self._entries = {}
+
+        if self.shared_version:
+            result = db.session.execute(
+                update(MenuVersion.__table__)
+                .where(MenuVersion.id == MENU_VERSION_ID)
+                .values(version=MenuVersion.version + 1))
+            # a database created before the counter row existed
+            if result.rowcount == 0:
+                db.session.add(MenuVersion(id=MENU_VERSION_ID, version=1))
+            db.session.commit()
+
+    '''
+    get(representation, build)
+        returns the (body, etag) of a representation.
+        `build` is called to create the payload when nothing is cached
+        for the current version
+    '''
+    def get(self, representation, build):
+        version = self.version()
+        entry = self._entries.get(representation)
+        if entry is not None and entry[0] == version:
+            return entry[1], entry[2]
+
+        # built from the primary, a lagging replica would stay cached
+        # until the next change. encoded by the app json provider
+        with use_primary():
+            body = json.dumps(build()).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            # a write which happened while building wins
+            if version == (self._local_version, version[1]):
+                self._entries[representation] = (version, body, etag)
+        return body, etag
@@ -1,23 +1,38 @@
 import os
-from sqlalchemy import Column, String, Integer
+import logging
+from sqlalchemy import Column, String, Integer, event, orm
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from fsnd_common.pool import engine_options, use_sqlite_wal
+from fsnd_common.routing import ReplicaRouter, RoutingSQLAlchemy
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+# DATABASE_URL points the app to another database, e.g. when testing
+database_path = os.environ.get('DATABASE_URL',
+                               "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
+
+# reads of GET requests go to the replicas, when there are some
+db = RoutingSQLAlchemy()
 
-db = SQLAlchemy()
+logger = logging.getLogger(__name__)
 
 '''
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service.
+    connections are pooled (see fsnd_common.pool.engine_options) and SQLite runs
+    in WAL mode, so readers are not blocked while a drink is written.
+    the read replicas are DATABASE_REPLICA_URLS, see fsnd_common.routing.ReplicaRouter
 '''
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path, app.config, 'coffee')
+    use_sqlite_wal()
     db.app = app
     db.init_app(app)
+    ReplicaRouter(app, 'coffee')
 
 '''
 db_drop_and_create_all()
@@ -28,6 +43,31 @@ db_drop_and_create_all()
 def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
+    db.session.add(MenuVersion(id=MENU_VERSION_ID, version=0))
+    db.session.commit()
+
+'''
+MenuVersion
+    a single row counter which is increased every time the drinks change,
+    so that every server process can tell when its cached menu is stale
+'''
+MENU_VERSION_ID = 1
+
+class MenuVersion(db.Model):
+    __tablename__ = 'menu_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+'''
+parse_recipe(recipe)
+    parses a recipe json blob into its long form (the full list of
+    ingredients) and its short form (only color and parts)
+'''
+def parse_recipe(recipe):
+    long_recipe = json.loads(recipe)
+    short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in long_recipe]
+    return long_recipe, short_recipe
 
 '''
 Drink
@@ -42,17 +82,43 @@ class Drink(db.Model):
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
     recipe =  Column(String(180), nullable=False)
 
+    '''
+    init_on_load()
+        a drink loaded from the database parses its recipe on first use
+    '''
+    @orm.reconstructor
+    def init_on_load(self):
+        self._parsed_recipe = None
+
+    '''
+    parsed_recipe()
+        the long and short form of the recipe, parsed once per drink
+        and parsed again only after `recipe` is assigned or reloaded.
+        a stored recipe which can not be parsed is an empty recipe,
+        so one bad row does not break the menu
+    '''
+    def parsed_recipe(self):
+        # loads an expired recipe first, which drops the stale memo
+        recipe = self.recipe
+        parsed = getattr(self, '_parsed_recipe', None)
+        if parsed is None:
+            try:
+                parsed = parse_recipe(recipe)
+            except (TypeError, ValueError, KeyError):
+                logger.warning('drink %s has a malformed recipe', self.id)
+                parsed = ([], [])
+            self._parsed_recipe = parsed
+        return parsed
+
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print("Short: ", json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': self.parsed_recipe()[1]
         }
 
     '''
@@ -63,7 +129,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.parsed_recipe()[0]
         }
 
     '''
@@ -104,4 +170,23 @@ class Drink(db.Model):
         db.session.commit()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+'''
+Recipe memo
+    assigning a recipe parses it right away, so both representations are
+    ready when the drink is listed. an invalid recipe is left to
+    parsed_recipe() on first use
+'''
+@event.listens_for(Drink.recipe, 'set')
+def recipe_changed(target, value, oldvalue, initiator):
+    try:
+        target._parsed_recipe = parse_recipe(value)
+    except (TypeError, ValueError, KeyError):
+        target._parsed_recipe = None
+
+
+@event.listens_for(Drink, 'refresh')
+def recipe_reloaded(target, context, attrs):
+    if attrs is None or 'recipe' in attrs:
+        target._parsed_recipe = None
@@ -0,0 +1,223 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from Crypto.PublicKey import RSA
+from jose import jwk, jwt
+
+from src.auth import auth
+from src.auth.auth import AuthError, FailedTokenCache, JWKSCache, VerifiedTokenCache
+
+KID = 'test-key'
+
+
+def make_signing_key():
+    private_pem = RSA.generate(2048).exportKey().decode('utf-8')
+
+    public_jwk = jwk.construct(private_pem, 'RS256').public_key().to_dict()
+    public_jwk.update({'kid': KID, 'use': 'sig'})
+    return private_pem, {'keys': [public_jwk]}
+
+
+class JWKSHandler(BaseHTTPRequestHandler):
+    jwks = None
+    requests = 0
+    failing = False
+
+    def do_GET(self):
+        JWKSHandler.requests += 1
+        if JWKSHandler.failing:
+            self.send_error(500)
+            return
+        body = json.dumps(JWKSHandler.jwks).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AuthCacheTestCase(unittest.TestCase):
+    """Auth key and token caches, against a local JWKS stub"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.private_pem, cls.jwks = make_signing_key()
+
+        JWKSHandler.jwks = cls.jwks
+        cls.server = HTTPServer(('127.0.0.1', 0), JWKSHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.jwks_url = 'http://127.0.0.1:{}/.well-known/jwks.json'.format(
+            cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        JWKSHandler.requests = 0
+        JWKSHandler.failing = False
+        auth.jwks_cache = JWKSCache(self.jwks_url)
+        auth.verified_tokens = VerifiedTokenCache(max_size=2)
+        auth.failed_tokens = FailedTokenCache(max_size=2)
+
+    def make_token(self, expires_in=3600, kid=KID, **claims):
+        payload = {
+            'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+            'aud': auth.API_AUDIENCE,
+            'exp': int(time.time()) + expires_in,
+            'permissions': ['get:drinks-detail']
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self.private_pem, algorithm='RS256',
+                          headers={'kid': kid})
+
+    def test_keys_fetched_once(self):
+        for _ in range(3):
+            payload = auth.verify_decode_jwt(self.make_token())
+            self.assertEqual(payload['permissions'], ['get:drinks-detail'])
+
+        self.assertEqual(JWKSHandler.requests, 1)
+
+    def test_keys_from_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                         delete=False) as jwks_file:
+            json.dump(self.jwks, jwks_file)
+        self.addCleanup(os.remove, jwks_file.name)
+
+        auth.jwks_cache = JWKSCache('file://' + jwks_file.name)
+        payload = auth.verify_decode_jwt(self.make_token())
+        self.assertEqual(payload['aud'], auth.API_AUDIENCE)
+
+    def test_unknown_kid_refreshes_keys(self):
+        auth.jwks_cache = JWKSCache(self.jwks_url, min_refresh_interval=0)
+        auth.verify_decode_jwt(self.make_token())
+
+        with self.assertRaises(AuthError) as context:
+            auth.verify_decode_jwt(self.make_token(kid='rotated-key'))
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(JWKSHandler.requests, 2)
+
+    def test_unknown_kid_not_cached(self):
+        auth.jwks_cache = JWKSCache(self.jwks_url, min_refresh_interval=0)
+        token = self.make_token(kid='rotated-key')
+        with self.assertRaises(AuthError):
+            auth.verify_decode_jwt(token)
+        self.assertIsNone(auth.failed_tokens.get(token))
+
+        # accepted once the key is published
+        rotated = dict(self.jwks['keys'][0], kid='rotated-key')
+        JWKSHandler.jwks = {'keys': self.jwks['keys'] + [rotated]}
+        self.addCleanup(setattr, JWKSHandler, 'jwks', self.jwks)
+        payload = auth.verify_decode_jwt(token)
+        self.assertEqual(payload['aud'], auth.API_AUDIENCE)
+
+    def test_keys_fetched_with_timeout(self):
+        with mock.patch.object(auth, 'urlopen', wraps=auth.urlopen) as urlopen:
+            auth.verify_decode_jwt(self.make_token())
+        self.assertEqual(urlopen.call_args[1]['timeout'], auth.JWKS_FETCH_TIMEOUT)
+
+    def test_failed_fetch_is_auth_error(self):
+        JWKSHandler.failing = True
+        token = self.make_token()
+        for _ in range(2):
+            with self.assertRaises(AuthError) as context:
+                auth.verify_decode_jwt(token)
+            self.assertEqual(context.exception.status_code, 503)
+
+        # backed off, and the token is not remembered as rejected
+        self.assertEqual(JWKSHandler.requests, 1)
+        self.assertIsNone(auth.failed_tokens.get(token))
+
+    def test_failed_refresh_keeps_cached_keys(self):
+        auth.jwks_cache = JWKSCache(self.jwks_url, ttl=0, retry_interval=0)
+        auth.verify_decode_jwt(self.make_token(sub='1'))
+
+        JWKSHandler.failing = True
+        payload = auth.verify_decode_jwt(self.make_token(sub='2'))
+        self.assertEqual(payload['sub'], '2')
+        self.assertEqual(JWKSHandler.requests, 2)
+
+        # retried once the back off is over
+        JWKSHandler.failing = False
+        auth.verify_decode_jwt(self.make_token(sub='3'))
+        self.assertEqual(JWKSHandler.requests, 3)
+
+    def test_verified_token_cached(self):
+        token = self.make_token()
+        auth.verify_decode_jwt(token)
+        self.assertIsNotNone(auth.verified_tokens.get(token))
+
+    def test_verified_token_cache_is_bounded(self):
+        tokens = [self.make_token(sub=str(index)) for index in range(3)]
+        for token in tokens:
+            auth.verify_decode_jwt(token)
+
+        self.assertIsNone(auth.verified_tokens.get(tokens[0]))
+        self.assertIsNotNone(auth.verified_tokens.get(tokens[2]))
+
+    def test_verified_token_expires(self):
+        token = self.make_token()
+        auth.verified_tokens.put(token, {'exp': time.time() - 1})
+        self.assertIsNone(auth.verified_tokens.get(token))
+
+    def test_expired_token(self):
+        with self.assertRaises(AuthError) as context:
+            auth.verify_decode_jwt(self.make_token(expires_in=-60))
+        self.assertEqual(context.exception.status_code, 401)
+        self.assertEqual(context.exception.error['code'], 'token_expired')
+        # rejected before the keys are needed
+        self.assertEqual(JWKSHandler.requests, 0)
+
+    def test_malformed_tokens(self):
+        header, payload, signature = self.make_token().split('.')
+        for token, status_code in [
+                ('not-a-token', 400),
+                ('a.b', 400),
+                ('{}.{}.{}'.format(header, payload, '!' * 8), 400),
+                ('{}.{}.{}'.format('eyJhbGciOiJub25lIn0', payload, signature), 400),
+                ('{}.{}.{}'.format('eyJhbGciOiJSUzI1NiJ9', payload, signature), 401)]:
+            with self.assertRaises(AuthError) as context:
+                auth.verify_decode_jwt(token)
+            self.assertEqual(context.exception.status_code, status_code, token)
+
+        self.assertEqual(JWKSHandler.requests, 0)
+
+    def test_failed_token_cached(self):
+        other_pem, _ = make_signing_key()
+        token = jwt.encode({'exp': int(time.time()) + 3600}, other_pem,
+                           algorithm='RS256', headers={'kid': KID})
+
+        with mock.patch.object(auth.jwt, 'decode', wraps=auth.jwt.decode) as decode:
+            for _ in range(3):
+                with self.assertRaises(AuthError) as context:
+                    auth.verify_decode_jwt(token)
+                self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_failed_token_raises_new_error(self):
+        auth.failed_tokens.put('token', AuthError({'code': 'invalid_header'}, 400))
+        first = auth.failed_tokens.get('token')
+        second = auth.failed_tokens.get('token')
+
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.error, second.error)
+        self.assertEqual((second.error, second.status_code),
+                         ({'code': 'invalid_header'}, 400))
+
+    def test_failed_token_expires(self):
+        auth.failed_tokens = FailedTokenCache(ttl=0)
+        auth.failed_tokens.put('token', AuthError({}, 401))
+        self.assertIsNone(auth.failed_tokens.get('token'))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from jose import jwt
+from sqlalchemy import event
+
+# the tests run against their own database
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'batch_test.db')
+
+from src.api import app
+from src.auth import auth
+from src.auth.auth import JWKSCache
+from src.database.models import Drink, db
+from test_auth import KID, make_signing_key
+
+RECIPE = [{'name': 'water', 'color': 'blue', 'parts': 1}]
+
+
+class BatchTestCase(unittest.TestCase):
+    """POST /drinks/batch"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.private_pem, jwks = make_signing_key()
+        jwks_file = os.path.join(tempfile.mkdtemp(), 'jwks.json')
+        with open(jwks_file, 'w') as f:
+            json.dump(jwks, f)
+        cls.jwks_url = 'file://' + jwks_file
+
+    def setUp(self):
+        auth.jwks_cache = JWKSCache(self.jwks_url)
+        self.client = app.test_client
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for title in ['Water', 'Coffee', 'Tea']:
+                db.session.add(Drink(title=title, recipe=json.dumps(RECIPE)))
+            db.session.commit()
+            self.ids = dict((drink.title, drink.id) for drink in Drink.query.all())
+
+    def make_token(self, permissions):
+        return jwt.encode({
+            'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+            'aud': auth.API_AUDIENCE,
+            'exp': int(time.time()) + 3600,
+            'permissions': permissions
+        }, self.private_pem, algorithm='RS256', headers={'kid': KID})
+
+    def batch(self, operations, permissions=('post:drinks', 'patch:drinks', 'delete:drinks'), **details):
+        details['operations'] = operations
+        token = self.make_token(list(permissions))
+        return self.client().post('/drinks/batch', json=details,
+                                  headers={'Authorization': 'Bearer ' + token})
+
+    def titles(self):
+        with app.app_context():
+            return sorted(drink.title for drink in Drink.query.all())
+
+    def test_batch(self):
+        res = self.batch([
+            {'op': 'create', 'title': 'Latte', 'recipe': RECIPE},
+            {'op': 'update', 'id': self.ids['Water'], 'title': 'Sparkling water'},
+            {'op': 'delete', 'id': self.ids['Tea']}
+        ])
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual([result['status'] for result in data['results']], [200, 200, 200])
+        self.assertEqual(data['results'][0]['drink']['title'], 'Latte')
+        self.assertEqual(self.titles(), ['Coffee', 'Latte', 'Sparkling water'])
+
+    def test_batch_reuses_freed_titles(self):
+        res = self.batch([
+            {'op': 'delete', 'id': self.ids['Tea']},
+            {'op': 'update', 'id': self.ids['Water'], 'title': 'Tea'},
+            {'op': 'update', 'id': self.ids['Coffee'], 'title': 'Water'},
+            {'op': 'create', 'title': 'Coffee', 'recipe': RECIPE}
+        ])
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.titles(), ['Coffee', 'Tea', 'Water'])
+
+    def test_batch_duplicate_title_is_atomic(self):
+        res = self.batch([
+            {'op': 'create', 'title': 'Latte', 'recipe': RECIPE},
+            {'op': 'create', 'title': 'Coffee', 'recipe': RECIPE},
+            {'op': 'create', 'title': 'Latte', 'recipe': RECIPE}
+        ])
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual([result['status'] for result in data['results']], [424, 409, 409])
+        self.assertEqual(self.titles(), ['Coffee', 'Tea', 'Water'])
+
+    def test_batch_not_atomic(self):
+        res = self.batch([
+            {'op': 'create', 'title': 'Latte', 'recipe': RECIPE},
+            {'op': 'delete', 'id': 999}
+        ], atomic=False)
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([result['status'] for result in data['results']], [200, 404])
+        self.assertEqual(self.titles(), ['Coffee', 'Latte', 'Tea', 'Water'])
+
+    def test_batch_permission_per_operation_type(self):
+        res = self.batch([
+            {'op': 'create', 'title': 'Latte', 'recipe': RECIPE},
+            {'op': 'delete', 'id': self.ids['Tea']}
+        ], permissions=['post:drinks'], atomic=False)
+        data = res.get_json()
+
+        self.assertEqual([result['status'] for result in data['results']], [200, 403])
+        self.assertEqual(self.titles(), ['Coffee', 'Latte', 'Tea', 'Water'])
+
+    def test_batch_malformed_op(self):
+        res = self.batch([
+            {'op': 'create', 'title': 'Latte', 'recipe': RECIPE},
+            {'op': ['create'], 'title': 'Mocha', 'recipe': RECIPE}
+        ])
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.titles(), ['Coffee', 'Tea', 'Water'])
+
+    def test_batch_bool_id(self):
+        res = self.batch([
+            {'op': 'delete', 'id': True},
+            {'op': 'update', 'id': False, 'title': 'Latte'}
+        ], atomic=False)
+        data = res.get_json()
+
+        self.assertEqual([result['status'] for result in data['results']], [422, 422])
+        self.assertEqual(self.titles(), ['Coffee', 'Tea', 'Water'])
+
+    def test_batch_query_count(self):
+        statements = []
+        with app.app_context():
+            engine = db.engine
+
+        def listener(*args):
+            statements.append(args[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            self.batch([{'op': 'create', 'title': 'Drink {}'.format(index), 'recipe': RECIPE}
+                        for index in range(50)])
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+        selects = [statement for statement in statements if statement.startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+
+    def test_batch_requires_token(self):
+        res = self.client().post('/drinks/batch', json={'operations': []})
+        self.assertEqual(res.status_code, 401)
+        self.assertFalse(res.get_json()['success'])
+
+    def test_auth_errors_keep_their_status(self):
+        malformed = self.client().post('/drinks/batch', json={'operations': []},
+                                       headers={'Authorization': 'Bearer not-a-token'})
+        forbidden = self.client().post('/drinks', json={'title': 'Latte', 'recipe': RECIPE},
+                                       headers={'Authorization': 'Bearer ' + self.make_token(['get:drinks-detail'])})
+
+        self.assertEqual(malformed.status_code, 400)
+        self.assertEqual(malformed.get_json()['error'], 400)
+        self.assertEqual(forbidden.status_code, 403)
+        self.assertEqual(forbidden.get_json()['message'], 'Permission not found.')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from jose import jwt
+
+# the tests run against their own database
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'cache_test.db')
+
+from src import api
+from src.api import app
+from src.auth import auth
+from src.auth.auth import JWKSCache
+from src.cache import DrinksResponseCache
+from src.database.models import Drink, MenuVersion, db, db_drop_and_create_all
+from test_auth import KID, make_signing_key
+
+RECIPE = [{'name': 'water', 'color': 'blue', 'parts': 1}]
+
+
+class DrinksCacheTestCase(unittest.TestCase):
+    """ETags and invalidation of the cached drinks listings"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.private_pem, jwks = make_signing_key()
+        jwks_file = os.path.join(tempfile.mkdtemp(), 'jwks.json')
+        with open(jwks_file, 'w') as f:
+            json.dump(jwks, f)
+        cls.jwks_url = 'file://' + jwks_file
+
+    def setUp(self):
+        auth.jwks_cache = JWKSCache(self.jwks_url)
+        api.drinks_cache = DrinksResponseCache()
+        self.client = app.test_client
+        with app.app_context():
+            db_drop_and_create_all()
+            for title in ['Water', 'Coffee']:
+                db.session.add(Drink(title=title, recipe=json.dumps(RECIPE)))
+            db.session.commit()
+            self.water_id = Drink.query.filter_by(title='Water').one().id
+
+    def headers(self, permission):
+        token = jwt.encode({
+            'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+            'aud': auth.API_AUDIENCE,
+            'exp': int(time.time()) + 3600,
+            'permissions': [permission]
+        }, self.private_pem, algorithm='RS256', headers={'kid': KID})
+        return {'Authorization': 'Bearer ' + token}
+
+    def titles(self, res):
+        return sorted(drink['title'] for drink in res.get_json()['drinks'])
+
+    def assert_invalidated(self, write):
+        etag = self.client().get('/drinks').headers['ETag']
+        self.assertEqual(write().status_code, 200)
+
+        res = self.client().get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        return res
+
+    def test_etag(self):
+        first = self.client().get('/drinks')
+        second = self.client().get('/drinks')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.headers['ETag'])
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertEqual(self.titles(first), ['Coffee', 'Water'])
+
+    def test_not_modified(self):
+        etag = self.client().get('/drinks').headers['ETag']
+        res = self.client().get('/drinks', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+    def test_detail_not_modified(self):
+        headers = self.headers('get:drinks-detail')
+        res = self.client().get('/drinks-detail', headers=headers)
+        self.assertEqual(res.get_json()['drinks'][0]['recipe'], RECIPE)
+
+        headers['If-None-Match'] = res.headers['ETag']
+        res = self.client().get('/drinks-detail', headers=headers)
+        self.assertEqual(res.status_code, 304)
+
+    def test_post_invalidates(self):
+        res = self.assert_invalidated(lambda: self.client().post(
+            '/drinks', json={'title': 'Tea', 'recipe': RECIPE},
+            headers=self.headers('post:drinks')))
+        self.assertEqual(self.titles(res), ['Coffee', 'Tea', 'Water'])
+
+    def test_patch_invalidates(self):
+        res = self.assert_invalidated(lambda: self.client().patch(
+            '/drinks/{}'.format(self.water_id), json={'title': 'Tea'},
+            headers=self.headers('patch:drinks')))
+        self.assertEqual(self.titles(res), ['Coffee', 'Tea'])
+
+    def test_delete_invalidates(self):
+        res = self.assert_invalidated(lambda: self.client().delete(
+            '/drinks/{}'.format(self.water_id),
+            headers=self.headers('delete:drinks')))
+        self.assertEqual(self.titles(res), ['Coffee'])
+
+    def test_shared_version(self):
+        # two server processes sharing the database
+        cache, other = DrinksResponseCache(shared_version=True), DrinksResponseCache(shared_version=True)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {'drinks': len(builds)}
+
+        with app.test_request_context('/drinks'):
+            body, etag = cache.get('short', build)
+            self.assertEqual(cache.get('short', build), (body, etag))
+            self.assertEqual(len(builds), 1)
+
+            other.invalidate()
+            self.assertEqual(MenuVersion.query.one().version, 1)
+            self.assertNotEqual(cache.get('short', build)[1], etag)
+            self.assertEqual(len(builds), 2)
+
+    def test_shared_version_without_counter_row(self):
+        cache = DrinksResponseCache(shared_version=True)
+        with app.test_request_context('/drinks'):
+            MenuVersion.query.delete()
+            db.session.commit()
+
+            cache.invalidate()
+            self.assertEqual(MenuVersion.query.one().version, 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
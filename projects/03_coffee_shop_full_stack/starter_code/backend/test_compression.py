@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+# the app reads its database url when imported
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'compression_test.db')
+
+from src.api import app, compression
+from fsnd_common.compression import negotiate
+from src.database.models import Drink, db
+
+RECIPE = [{'name': 'water', 'color': 'blue', 'parts': 1}]
+
+
+class CompressionTestCase(unittest.TestCase):
+    """gzip responses of GET /drinks"""
+
+    def setUp(self):
+        self.client = app.test_client
+        self.min_size = compression.min_size
+        compression.min_size = 0
+        compression.clear()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for title in ['Water', 'Coffee', 'Tea']:
+                db.session.add(Drink(title=title, recipe=json.dumps(RECIPE)))
+            db.session.commit()
+
+    def tearDown(self):
+        compression.min_size = self.min_size
+
+    def test_gzip(self):
+        plain = self.client().get('/drinks')
+        res = self.client().get('/drinks', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(res.headers['Access-Control-Allow-Origin'], '*')
+        self.assertEqual(json.loads(gzip.decompress(res.data)), json.loads(plain.data))
+
+    def test_compressed_body_is_cached(self):
+        first = self.client().get('/drinks', headers={'Accept-Encoding': 'gzip'})
+        hits = compression.hits
+        second = self.client().get('/drinks', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(compression.hits, hits + 1)
+        self.assertEqual(first.data, second.data)
+
+    def test_weak_etag_is_not_modified(self):
+        res = self.client().get('/drinks', headers={'Accept-Encoding': 'gzip'})
+        etag = res.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        res = self.client().get('/drinks', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+
+    def test_small_body_not_compressed(self):
+        compression.min_size = 1024 * 1024
+        res = self.client().get('/drinks', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate('gzip, deflate, br', ('br', 'gzip')), 'br')
+        self.assertEqual(negotiate('br;q=0.5, gzip', ('br', 'gzip')), 'gzip')
+        self.assertEqual(negotiate('*', ('gzip',)), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0, identity', ('gzip',)))
+        self.assertIsNone(negotiate('', ('gzip',)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from jose import jwt
+from sqlalchemy import text
+
+# the tests run against their own database
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'models_test.db')
+
+from src import api
+from src.api import app
+from src.auth import auth
+from src.auth.auth import JWKSCache
+from src.cache import DrinksResponseCache
+from src.database.models import Drink, db
+from test_auth import KID, make_signing_key
+
+RECIPE = [{'name': 'water', 'color': 'blue', 'parts': 1}]
+NEW_RECIPE = [{'name': 'milk', 'color': 'white', 'parts': 2}]
+
+
+class DrinkRecipeTestCase(unittest.TestCase):
+    """short() and long() of a drink follow its stored recipe"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.private_pem, jwks = make_signing_key()
+        jwks_file = os.path.join(tempfile.mkdtemp(), 'jwks.json')
+        with open(jwks_file, 'w') as f:
+            json.dump(jwks, f)
+        cls.jwks_url = 'file://' + jwks_file
+
+    def setUp(self):
+        auth.jwks_cache = JWKSCache(self.jwks_url)
+        api.drinks_cache = DrinksResponseCache()
+        self.client = app.test_client
+        self.context = app.app_context()
+        self.context.push()
+        db.drop_all()
+        db.create_all()
+        self.drink = Drink(title='Water', recipe=json.dumps(RECIPE))
+        self.drink.insert()
+        self.drink_id = self.drink.id
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def store_recipe(self, recipe):
+        # written behind the back of the session, as another process would
+        with db.engine.begin() as connection:
+            connection.execute(text('UPDATE drink SET recipe = :recipe WHERE id = :id'),
+                               recipe=recipe, id=self.drink_id)
+
+    def test_assigned_recipe(self):
+        self.assertEqual(self.drink.long()['recipe'], RECIPE)
+
+        self.drink.recipe = json.dumps(NEW_RECIPE)
+        self.assertEqual(self.drink.long()['recipe'], NEW_RECIPE)
+        self.assertEqual(self.drink.short()['recipe'], [{'color': 'white', 'parts': 2}])
+
+    def test_patched_recipe(self):
+        token = jwt.encode({
+            'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+            'aud': auth.API_AUDIENCE,
+            'exp': int(time.time()) + 3600,
+            'permissions': ['patch:drinks', 'get:drinks-detail']
+        }, self.private_pem, algorithm='RS256', headers={'kid': KID})
+        headers = {'Authorization': 'Bearer ' + token}
+
+        res = self.client().patch('/drinks/{}'.format(self.drink_id),
+                                  json={'recipe': NEW_RECIPE}, headers=headers)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get('/drinks-detail', headers=headers)
+        self.assertEqual(res.get_json()['drinks'][0]['recipe'], NEW_RECIPE)
+        self.assertEqual(Drink.query.get(self.drink_id).long()['recipe'], NEW_RECIPE)
+
+    def test_expired_drink(self):
+        drink = Drink.query.get(self.drink_id)
+        self.assertEqual(drink.long()['recipe'], RECIPE)
+
+        self.store_recipe(json.dumps(NEW_RECIPE))
+        db.session.expire(drink)
+        self.assertEqual(drink.long()['recipe'], NEW_RECIPE)
+
+    def test_refreshed_drink(self):
+        drink = Drink.query.get(self.drink_id)
+        self.assertEqual(drink.short()['recipe'], [{'color': 'blue', 'parts': 1}])
+
+        self.store_recipe(json.dumps(NEW_RECIPE))
+        db.session.refresh(drink)
+        self.assertEqual(drink.short()['recipe'], [{'color': 'white', 'parts': 2}])
+
+    def test_malformed_stored_recipe(self):
+        Drink(title='Coffee', recipe=json.dumps(RECIPE)).insert()
+        for recipe in ['not json', '{"color": "blue"}', '[{"name": "water"}]']:
+            self.store_recipe(recipe)
+            db.session.expire_all()
+
+            self.assertEqual(Drink.query.get(self.drink_id).long()['recipe'], [])
+            api.drinks_cache.invalidate()
+            res = self.client().get('/drinks')
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(sorted(drink['title'] for drink in res.get_json()['drinks']),
+                             ['Coffee', 'Water'])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()